@@ -1,192 +1,253 @@
 """
 Character library for cosplay generation
 """
-from typing import Dict, List, Any
+from collections import defaultdict
+from functools import lru_cache
+from sys import intern
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Tuple
+
+def _initialize_characters() -> Dict[str, Dict[str, Any]]:
+    """Initialize character definitions"""
+    return {
+        "sailor-moon": {
+            "name": "Sailor Moon",
+            "style": "anime",
+            "costume": "detailed blue sailor costume with white collar and red bow",
+            "accessories": "moon tiara, white gloves, red ribbons in hair",
+            "hair": "blonde twin tails with red ribbons",
+            "pose": "magical girl pose with hand on hip",
+            "colors": ["blue", "white", "red", "yellow"],
+            "description": "Classic anime magical girl with sailor uniform"
+        },
+        "wonder-woman": {
+            "name": "Wonder Woman",
+            "style": "superhero",
+            "costume": "red and gold armor with blue star-spangled briefs",
+            "accessories": "golden tiara, lasso of truth, silver bracelets",
+            "hair": "long dark hair",
+            "pose": "heroic power pose with arms crossed",
+            "colors": ["red", "gold", "blue", "silver"],
+            "description": "Amazonian warrior princess with iconic superhero costume"
+        },
+        "dva": {
+            "name": "D.Va",
+            "style": "gaming",
+            "costume": "white and pink mech pilot suit with blue accents",
+            "accessories": "gaming headset, pink bunny ears, blue visor",
+            "hair": "brown hair in twin tails",
+            "pose": "gaming victory pose",
+            "colors": ["white", "pink", "blue", "brown"],
+            "description": "Professional gamer and mech pilot from Overwatch"
+        },
+        "harley-quinn": {
+            "name": "Harley Quinn",
+            "style": "comic",
+            "costume": "red and black jester outfit with diamond patterns",
+            "accessories": "red and black hair, white face paint, mallet",
+            "hair": "red and black pigtails",
+            "pose": "mischievous pose with mallet",
+            "colors": ["red", "black", "white"],
+            "description": "Chaotic villain with jester-inspired costume"
+        },
+        "zelda": {
+            "name": "Princess Zelda",
+            "style": "fantasy",
+            "costume": "elegant white and gold dress with royal symbols",
+            "accessories": "golden crown, royal jewelry, magical aura",
+            "hair": "blonde hair in elegant style",
+            "pose": "regal pose with hand extended",
+            "colors": ["white", "gold", "blue", "green"],
+            "description": "Royal princess with magical powers and elegant attire"
+        },
+        "power-girl": {
+            "name": "Power Girl",
+            "style": "superhero",
+            "costume": "white costume with blue cape and red S symbol",
+            "accessories": "blue cape, red boots, confident expression",
+            "hair": "blonde hair in ponytail",
+            "pose": "superhero flying pose",
+            "colors": ["white", "blue", "red"],
+            "description": "Powerful superhero with classic costume design"
+        },
+        "2b": {
+            "name": "2B",
+            "style": "gaming",
+            "costume": "black and white maid outfit with combat elements",
+            "accessories": "white blindfold, black gloves, combat boots",
+            "hair": "white hair in elegant style",
+            "pose": "combat ready pose",
+            "colors": ["black", "white", "silver"],
+            "description": "Android combat unit with elegant maid-inspired design"
+        },
+        "mikasa": {
+            "name": "Mikasa Ackerman",
+            "series": "Attack on Titan",
+            "style": "anime",
+            "hair_style": "short black bob cut with straight bangs",
+            "hair_color": "black",
+            "eye_color": "dark gray",
+            "outfit_details": "Survey Corps military uniform with brown cropped jacket over white long-sleeve shirt, white pants with brown knee-high boots, leather harness straps across chest and waist",
+            "accessories": "iconic red knitted scarf around neck, ODM gear (Omni-Directional Mobility gear) with gas tanks and blade holders, brown leather straps and buckles, military insignia patches",
+            "signature_items": "dual steel blades for ODM gear, silver blade handles",
+            "signature_pose": "determined military stance with hand on blade hilt",
+            "expression": "serious and determined with piercing gaze",
+            "environment": "post-apocalyptic military setting with massive stone walls",
+            "costume": "complete Survey Corps uniform with ODM gear harness",
+            "hair": "short black bob with bangs",
+            "pose": "determined warrior stance",
+            "colors": ["brown", "white", "red", "black", "silver", "gray"],
+            "description": "Elite soldier from Attack on Titan with iconic red scarf and ODM gear",
+            "personality_traits": "fierce, protective, stoic, loyal",
+            "key_features": "red scarf (most important), military precision, intense expression, combat-ready posture"
+        },
+        "catwoman": {
+            "name": "Catwoman",
+            "style": "comic",
+            "costume": "black leather catsuit with cat ears",
+            "accessories": "black mask, whip, cat ears, claws",
+            "hair": "black hair",
+            "pose": "stealthy cat pose",
+            "colors": ["black", "silver"],
+            "description": "Feline-themed thief with sleek black costume"
+        },
+        "ahri": {
+            "name": "Ahri",
+            "style": "gaming",
+            "costume": "elegant white and gold outfit with fox elements",
+            "accessories": "nine fox tails, golden jewelry, magical orbs",
+            "hair": "white hair with fox ears",
+            "pose": "mystical fox pose",
+            "colors": ["white", "gold", "blue"],
+            "description": "Nine-tailed fox spirit with elegant magical attire"
+        }
+    }
+
+
+def _freeze_characters(raw: Dict[str, Dict[str, Any]]) -> Mapping[str, Mapping[str, Any]]:
+    """Intern repeated strings and wrap everything in read-only views"""
+    characters = {}
+    for char_id, char_data in raw.items():
+        # Share one string object per repeated style/color value
+        char_data["style"] = intern(char_data["style"])
+        char_data["colors"] = tuple(intern(color) for color in char_data["colors"])
+        characters[intern(char_id)] = MappingProxyType(char_data)
+    return MappingProxyType(characters)
+
+# Character data is static, so it is built once per process at import and shared read-only
+_CHARACTERS = _freeze_characters(_initialize_characters())
+_NO_CHARACTER: Mapping[str, Any] = MappingProxyType({})
+
+# Summaries are read-only too; the public accessors hand out fresh dicts built from them,
+# so callers can modify or serialize their results without touching the shared state
+_ALL_SUMMARY = tuple(
+    MappingProxyType({
+        "id": char_id,
+        "name": char_data["name"],
+        "style": char_data["style"],
+        "description": char_data["description"]
+    })
+    for char_id, char_data in _CHARACTERS.items()
+)
+_by_style = defaultdict(list)
+for _summary in _ALL_SUMMARY:
+    _by_style[_summary["style"]].append(_summary)
+_BY_STYLE = MappingProxyType({style: tuple(summaries) for style, summaries in _by_style.items()})
+del _by_style, _summary
+
+# Prompt templates are pure functions of the character, join them up front
+_PROMPT_TEMPLATES = MappingProxyType({
+    char_id: ", ".join(filter(None, [
+        char_data["name"],
+        char_data["costume"],
+        char_data["accessories"],
+        char_data["hair"],
+        char_data["pose"]
+    ]))
+    for char_id, char_data in _CHARACTERS.items()
+})
+
+def _trigrams(text: str) -> frozenset:
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+# Lowercased name, description and style per character, each with its trigram set, paired with
+# its summary; fields stay separate so a query can't match across their boundaries
+_SEARCH_FIELDS = tuple(
+    (
+        tuple(
+            (field, _trigrams(field))
+            for field in (char_data["name"].lower(), char_data["description"].lower(), char_data["style"].lower())
+        ),
+        summary
+    )
+    for char_data, summary in zip(_CHARACTERS.values(), _ALL_SUMMARY)
+)
+
+# Lookups are memoized at module level so the caches don't hold on to library instances
+@lru_cache(maxsize=64)
+def get_character(character_id: str) -> Mapping[str, Any]:
+    """Get character by ID"""
+    return _CHARACTERS.get(character_id, _NO_CHARACTER)
+
+def get_all_characters() -> List[Dict[str, Any]]:
+    """Get all characters"""
+    return [dict(summary) for summary in _ALL_SUMMARY]
+
+def get_characters_by_style(style: str) -> List[Dict[str, Any]]:
+    """Get characters filtered by style"""
+    return [dict(summary) for summary in _BY_STYLE.get(style, ())]
+
+@lru_cache(maxsize=64)
+def get_character_prompt_template(character_id: str) -> str:
+    """Get prompt template for character"""
+    return _PROMPT_TEMPLATES.get(character_id, "")
+
+@lru_cache(maxsize=64)
+def get_character_colors(character_id: str) -> Tuple[str, ...]:
+    """Get character's color palette"""
+    return get_character(character_id).get("colors", ())
+
+def search_characters(query: str) -> List[Dict[str, Any]]:
+    """Search characters by name or description"""
+    return [dict(summary) for summary in _search_summaries(query)]
+
+@lru_cache(maxsize=256)
+def _search_summaries(query: str) -> Tuple[Mapping[str, Any], ...]:
+    """Read-only summaries of the characters matching a query"""
+    query_lower = query.lower()
+    # Every trigram of a substring appears in the text, so a missing one rules a character out cheaply
+    query_trigrams = _trigrams(query_lower)
+    return tuple(
+        summary for fields, summary in _SEARCH_FIELDS
+        if any(query_trigrams <= trigrams and query_lower in field for field, trigrams in fields)
+    )
 
 class CharacterLibrary:
+    """Facade over the module-level character functions, kept for existing callers"""
+
     def __init__(self):
-        self.characters = self._initialize_characters()
-    
-    def _initialize_characters(self) -> Dict[str, Dict[str, Any]]:
-        """Initialize character definitions"""
-        return {
-            "sailor-moon": {
-                "name": "Sailor Moon",
-                "style": "anime",
-                "costume": "detailed blue sailor costume with white collar and red bow",
-                "accessories": "moon tiara, white gloves, red ribbons in hair",
-                "hair": "blonde twin tails with red ribbons",
-                "pose": "magical girl pose with hand on hip",
-                "colors": ["blue", "white", "red", "yellow"],
-                "description": "Classic anime magical girl with sailor uniform"
-            },
-            "wonder-woman": {
-                "name": "Wonder Woman",
-                "style": "superhero",
-                "costume": "red and gold armor with blue star-spangled briefs",
-                "accessories": "golden tiara, lasso of truth, silver bracelets",
-                "hair": "long dark hair",
-                "pose": "heroic power pose with arms crossed",
-                "colors": ["red", "gold", "blue", "silver"],
-                "description": "Amazonian warrior princess with iconic superhero costume"
-            },
-            "dva": {
-                "name": "D.Va",
-                "style": "gaming",
-                "costume": "white and pink mech pilot suit with blue accents",
-                "accessories": "gaming headset, pink bunny ears, blue visor",
-                "hair": "brown hair in twin tails",
-                "pose": "gaming victory pose",
-                "colors": ["white", "pink", "blue", "brown"],
-                "description": "Professional gamer and mech pilot from Overwatch"
-            },
-            "harley-quinn": {
-                "name": "Harley Quinn",
-                "style": "comic",
-                "costume": "red and black jester outfit with diamond patterns",
-                "accessories": "red and black hair, white face paint, mallet",
-                "hair": "red and black pigtails",
-                "pose": "mischievous pose with mallet",
-                "colors": ["red", "black", "white"],
-                "description": "Chaotic villain with jester-inspired costume"
-            },
-            "zelda": {
-                "name": "Princess Zelda",
-                "style": "fantasy",
-                "costume": "elegant white and gold dress with royal symbols",
-                "accessories": "golden crown, royal jewelry, magical aura",
-                "hair": "blonde hair in elegant style",
-                "pose": "regal pose with hand extended",
-                "colors": ["white", "gold", "blue", "green"],
-                "description": "Royal princess with magical powers and elegant attire"
-            },
-            "power-girl": {
-                "name": "Power Girl",
-                "style": "superhero",
-                "costume": "white costume with blue cape and red S symbol",
-                "accessories": "blue cape, red boots, confident expression",
-                "hair": "blonde hair in ponytail",
-                "pose": "superhero flying pose",
-                "colors": ["white", "blue", "red"],
-                "description": "Powerful superhero with classic costume design"
-            },
-            "2b": {
-                "name": "2B",
-                "style": "gaming",
-                "costume": "black and white maid outfit with combat elements",
-                "accessories": "white blindfold, black gloves, combat boots",
-                "hair": "white hair in elegant style",
-                "pose": "combat ready pose",
-                "colors": ["black", "white", "silver"],
-                "description": "Android combat unit with elegant maid-inspired design"
-            },
-            "mikasa": {
-                "name": "Mikasa Ackerman",
-                "series": "Attack on Titan",
-                "style": "anime",
-                "hair_style": "short black bob cut with straight bangs",
-                "hair_color": "black",
-                "eye_color": "dark gray",
-                "outfit_details": "Survey Corps military uniform with brown cropped jacket over white long-sleeve shirt, white pants with brown knee-high boots, leather harness straps across chest and waist",
-                "accessories": "iconic red knitted scarf around neck, ODM gear (Omni-Directional Mobility gear) with gas tanks and blade holders, brown leather straps and buckles, military insignia patches",
-                "signature_items": "dual steel blades for ODM gear, silver blade handles",
-                "signature_pose": "determined military stance with hand on blade hilt",
-                "expression": "serious and determined with piercing gaze",
-                "environment": "post-apocalyptic military setting with massive stone walls",
-                "costume": "complete Survey Corps uniform with ODM gear harness",
-                "hair": "short black bob with bangs",
-                "pose": "determined warrior stance",
-                "colors": ["brown", "white", "red", "black", "silver", "gray"],
-                "description": "Elite soldier from Attack on Titan with iconic red scarf and ODM gear",
-                "personality_traits": "fierce, protective, stoic, loyal",
-                "key_features": "red scarf (most important), military precision, intense expression, combat-ready posture"
-            },
-            "catwoman": {
-                "name": "Catwoman",
-                "style": "comic",
-                "costume": "black leather catsuit with cat ears",
-                "accessories": "black mask, whip, cat ears, claws",
-                "hair": "black hair",
-                "pose": "stealthy cat pose",
-                "colors": ["black", "silver"],
-                "description": "Feline-themed thief with sleek black costume"
-            },
-            "ahri": {
-                "name": "Ahri",
-                "style": "gaming",
-                "costume": "elegant white and gold outfit with fox elements",
-                "accessories": "nine fox tails, golden jewelry, magical orbs",
-                "hair": "white hair with fox ears",
-                "pose": "mystical fox pose",
-                "colors": ["white", "gold", "blue"],
-                "description": "Nine-tailed fox spirit with elegant magical attire"
-            }
-        }
+        self.characters = _CHARACTERS
     
-    def get_character(self, character_id: str) -> Dict[str, Any]:
+    def get_character(self, character_id: str) -> Mapping[str, Any]:
         """Get character by ID"""
-        return self.characters.get(character_id, {})
+        return get_character(character_id)
     
     def get_all_characters(self) -> List[Dict[str, Any]]:
         """Get all characters"""
-        return [
-            {
-                "id": char_id,
-                "name": char_data["name"],
-                "style": char_data["style"],
-                "description": char_data["description"]
-            }
-            for char_id, char_data in self.characters.items()
-        ]
+        return get_all_characters()
     
     def get_characters_by_style(self, style: str) -> List[Dict[str, Any]]:
         """Get characters filtered by style"""
-        return [
-            {
-                "id": char_id,
-                "name": char_data["name"],
-                "style": char_data["style"],
-                "description": char_data["description"]
-            }
-            for char_id, char_data in self.characters.items()
-            if char_data["style"] == style
-        ]
+        return get_characters_by_style(style)
     
     def get_character_prompt_template(self, character_id: str) -> str:
         """Get prompt template for character"""
-        character = self.get_character(character_id)
-        if not character:
-            return ""
-        
-        template_parts = [
-            character["name"],
-            character["costume"],
-            character["accessories"],
-            character["hair"],
-            character["pose"]
-        ]
-        
-        return ", ".join(filter(None, template_parts))
+        return get_character_prompt_template(character_id)
     
-    def get_character_colors(self, character_id: str) -> List[str]:
+    def get_character_colors(self, character_id: str) -> Tuple[str, ...]:
         """Get character's color palette"""
-        character = self.get_character(character_id)
-        return character.get("colors", [])
+        return get_character_colors(character_id)
     
     def search_characters(self, query: str) -> List[Dict[str, Any]]:
         """Search characters by name or description"""
-        query_lower = query.lower()
-        results = []
-        
-        for char_id, char_data in self.characters.items():
-            if (query_lower in char_data["name"].lower() or 
-                query_lower in char_data["description"].lower() or
-                query_lower in char_data["style"].lower()):
-                results.append({
-                    "id": char_id,
-                    "name": char_data["name"],
-                    "style": char_data["style"],
-                    "description": char_data["description"]
-                })
-        
-        return results
\ No newline at end of file
+        return search_characters(query)
@@ -2,13 +2,56 @@
 Google Imagen Pro API client for cosplay image generation
 """
 import os
+import asyncio
 import base64
-from typing import Optional, Dict, Any
-import requests
-import json
+import gzip
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple, Union, BinaryIO, Iterator
+import httpx
+import orjson
 from google.auth import default
 from google.auth.transport.requests import Request
 
+# Access tokens live for an hour; refresh a little before that
+TOKEN_REFRESH_SECONDS = 50 * 60
+
+# Stand-ins for image data in a payload until the base64 bytes are spliced into the body
+IMAGE_PLACEHOLDER = "__image_base64__"
+MASK_PLACEHOLDER = "__mask_base64__"
+
+# Read size for file-backed images; a multiple of 3 so chunks base64-encode without padding
+B64_CHUNK_SIZE = 3 * 64 * 1024
+
+# Images may be raw bytes or a binary file object (e.g. an upload's spooled temp file)
+ImageSource = Union[bytes, BinaryIO]
+
+def _b64_chunks(data: ImageSource) -> Iterator[bytes]:
+    """Base64-encode an image, reading file objects chunk by chunk instead of all at once"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        yield base64.b64encode(data)
+        return
+    data.seek(0)
+    while chunk := data.read(B64_CHUNK_SIZE):
+        yield base64.b64encode(chunk)
+
+def _dump_payload(payload: Dict[str, Any], images: List[Tuple[str, ImageSource]]) -> bytes:
+    """
+    Serialize payload to JSON, splicing base64-encoded images in place of their placeholders
+
+    The base64 bytes go straight into the request body instead of being decoded to a str
+    and copied again by the JSON encoder. Images must be listed in payload order; they are
+    resolved from the end of the body so prompt text earlier on can never be mistaken for
+    a placeholder.
+    """
+    body = orjson.dumps(payload)
+    parts = []
+    for placeholder, data in reversed(images):
+        body, after = body.rsplit(b'"%s"' % placeholder.encode(), 1)
+        parts[:0] = [b'"', *_b64_chunks(data), b'"', after]
+    return b"".join([body, *parts])
+
+
 class ImagenClient:
     def __init__(self):
         self.project_id = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
@@ -19,9 +62,12 @@ class ImagenClient:
             raise ValueError("GOOGLE_CLOUD_PROJECT_ID environment variable is required")
 
         # Initialize Google Cloud credentials
+        self._token_lock = threading.Lock()
+        self._auth_header: Optional[Tuple[str, float]] = None
         try:
             self.credentials, _ = default()
             self.credentials.refresh(Request())
+            self._auth_header = (f"Bearer {self.credentials.token}", time.monotonic())
         except Exception as e:
             print(f"Warning: Could not authenticate with Google Cloud: {e}")
             self.credentials = None
@@ -29,14 +75,89 @@ class ImagenClient:
         # Imagen 4 Ultra API endpoint
         self.base_url = f"https://{self.location}-aiplatform.googleapis.com/v1"
         self.endpoint = f"projects/{self.project_id}/locations/{self.location}/publishers/google/models/imagen-4.0-ultra-generate-001:predict"
+
+        # Request parameters never change between calls, so build them once and share them
+        base_params = {
+            "sampleCount": 1,
+            "aspectRatio": "1:1",
+            "safetyFilterLevel": "block_some",
+            "personGeneration": "allow_adult",
+            "outputOptions": {
+                "compressionQuality": "lossless",
+                "mimeType": "image/png"
+            }
+        }
+        self._image_params = {
+            **base_params,
+            "editConfig": {
+                "editMode": "inpainting-insert",
+                "guidanceScale": 100,
+                "outputImageType": "BASE_IMAGE_MASK"
+            }
+        }
+        self._transformation_params = {
+            **base_params,
+            "editConfig": {
+                "editMode": "inpainting-replace",
+                "guidanceScale": 120,
+                "outputImageType": "EDITED_IMAGE"
+            },
+            "stylizationLevel": 100,
+            "seed": None
+        }
+
+        # Gzip request bodies (mostly base64 image data); opt-in, since not every endpoint
+        # accepts a compressed request body
+        self.gzip_requests = os.getenv("IMAGEN_GZIP_REQUESTS", "false").lower() == "true"
+
+        # Async client so in-flight generations don't pin a worker thread while waiting on the API
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(180.0, connect=10.0),
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            ),
+            headers={"Content-Type": "application/json"}
+        )
     
-    def generate_image(self, prompt: str, image_data: Optional[bytes] = None) -> Dict[str, Any]:
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Return the Authorization header, refreshing the token when it is close to expiry"""
+        cached = self._auth_header
+        if cached and time.monotonic() - cached[1] < TOKEN_REFRESH_SECONDS:
+            return {"Authorization": cached[0]}
+
+        # The refresh is a blocking HTTPS call, so it runs in a worker thread, not on the event loop
+        return await asyncio.to_thread(self._refresh_auth_header)
+
+    def _refresh_auth_header(self) -> Dict[str, str]:
+        """Refresh the token under the lock and return the new Authorization header"""
+        with self._token_lock:
+            # Another caller may have refreshed while we waited for the lock
+            cached = self._auth_header
+            if not cached or time.monotonic() - cached[1] >= TOKEN_REFRESH_SECONDS:
+                self.credentials.refresh(Request())
+                cached = (f"Bearer {self.credentials.token}", time.monotonic())
+                self._auth_header = cached
+            return {"Authorization": cached[0]}
+
+    async def _post(self, body: bytes, timeout: float) -> httpx.Response:
+        """POST a serialized payload to the predict endpoint, gzip-compressing it when enabled"""
+        headers = await self._auth_headers()
+        if self.gzip_requests:
+            # Level 1 gets most of the size reduction for a fraction of the CPU
+            body = await asyncio.to_thread(gzip.compress, body, 1)
+            headers["Content-Encoding"] = "gzip"
+        return await self.client.post(self.endpoint, headers=headers, content=body, timeout=timeout)
+
+    async def generate_image(self, prompt: str, image_data: Optional[ImageSource] = None) -> Dict[str, Any]:
         """
         Generate image using Imagen 4 Ultra API
 
         Args:
             prompt: Text prompt for image generation
-            image_data: Optional reference image data for transformation
+            image_data: Optional reference image (bytes or binary file object) for transformation
 
         Returns:
             Dictionary containing generation result
@@ -46,29 +167,17 @@ class ImagenClient:
             payload = {
                 "instances": [{
                     "prompt": prompt,
-                    "parameters": {
-                        "sampleCount": 1,
-                        "aspectRatio": "1:1",
-                        "safetyFilterLevel": "block_some",
-                        "personGeneration": "allow_adult",
-                        "outputOptions": {
-                            "compressionQuality": "lossless",
-                            "mimeType": "image/png"
-                        },
-                        "editConfig": {
-                            "editMode": "inpainting-insert",
-                            "guidanceScale": 100,
-                            "outputImageType": "BASE_IMAGE_MASK"
-                        }
-                    }
+                    "parameters": self._image_params
                 }]
             }
             
             # Add reference image if provided
+            images = []
             if image_data:
                 payload["instances"][0]["image"] = {
-                    "bytesBase64Encoded": base64.b64encode(image_data).decode('utf-8')
+                    "bytesBase64Encoded": IMAGE_PLACEHOLDER
                 }
+                images.append((IMAGE_PLACEHOLDER, image_data))
             
             # Check if we have valid credentials
             if not self.credentials:
@@ -77,22 +186,15 @@ class ImagenClient:
                     "error": "No valid Google Cloud credentials available"
                 }
 
-            # Make the API request
-            headers = {
-                "Authorization": f"Bearer {self.credentials.token}",
-                "Content-Type": "application/json"
-            }
+            # Reading and base64-encoding the photos is blocking work, so it runs off the event loop
+            body = await asyncio.to_thread(_dump_payload, payload, images)
 
-            response = requests.post(
-                self.endpoint,
-                headers=headers,
-                json=payload,
-                timeout=120
-            )
+            # Make the API request
+            response = await self._post(body, timeout=120)
             
             # Process response
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "predictions" in data and data["predictions"]:
                     prediction = data["predictions"][0]
                     return {
@@ -117,7 +219,7 @@ class ImagenClient:
                 "error": f"Imagen API error: {str(e)}"
             }
     
-    def validate_api_connection(self) -> bool:
+    async def validate_api_connection(self) -> bool:
         """
         Test API connection with a simple request
         """
@@ -126,10 +228,7 @@ class ImagenClient:
                 return False
 
             # Simple test request to check API connectivity
-            headers = {
-                "Authorization": f"Bearer {self.credentials.token}",
-                "Content-Type": "application/json"
-            }
+            headers = await self._auth_headers()
 
             test_payload = {
                 "instances": [{
@@ -141,10 +240,10 @@ class ImagenClient:
                 }]
             }
 
-            response = requests.post(
+            response = await self.client.post(
                 self.endpoint,
                 headers=headers,
-                json=test_payload,
+                content=orjson.dumps(test_payload),
                 timeout=30
             )
 
@@ -152,14 +251,14 @@ class ImagenClient:
         except Exception:
             return False
 
-    def generate_cosplay_transformation(self, prompt: str, base_image: bytes, mask_image: Optional[bytes] = None) -> Dict[str, Any]:
+    async def generate_cosplay_transformation(self, prompt: str, base_image: ImageSource, mask_image: Optional[ImageSource] = None) -> Dict[str, Any]:
         """
         Generate cosplay transformation using Imagen 4 Ultra with image editing capabilities
 
         Args:
             prompt: Detailed cosplay transformation prompt
-            base_image: Original human photo for transformation
-            mask_image: Optional mask to specify areas to transform
+            base_image: Original human photo (bytes or binary file object) for transformation
+            mask_image: Optional mask (bytes or binary file object) to specify areas to transform
 
         Returns:
             Dictionary containing transformation result
@@ -170,33 +269,20 @@ class ImagenClient:
                 "instances": [{
                     "prompt": prompt,
                     "image": {
-                        "bytesBase64Encoded": base64.b64encode(base_image).decode('utf-8')
+                        "bytesBase64Encoded": IMAGE_PLACEHOLDER
                     },
-                    "parameters": {
-                        "sampleCount": 1,
-                        "aspectRatio": "1:1",
-                        "safetyFilterLevel": "block_some",
-                        "personGeneration": "allow_adult",
-                        "outputOptions": {
-                            "compressionQuality": "lossless",
-                            "mimeType": "image/png"
-                        },
-                        "editConfig": {
-                            "editMode": "inpainting-replace",
-                            "guidanceScale": 120,
-                            "outputImageType": "EDITED_IMAGE"
-                        },
-                        "stylizationLevel": 100,
-                        "seed": None
-                    }
+                    "parameters": self._transformation_params
                 }]
             }
 
+            images = [(IMAGE_PLACEHOLDER, base_image)]
+
             # Add mask if provided for selective editing
             if mask_image:
                 payload["instances"][0]["mask"] = {
-                    "bytesBase64Encoded": base64.b64encode(mask_image).decode('utf-8')
+                    "bytesBase64Encoded": MASK_PLACEHOLDER
                 }
+                images.append((MASK_PLACEHOLDER, mask_image))
 
             # Check credentials
             if not self.credentials:
@@ -205,22 +291,15 @@ class ImagenClient:
                     "error": "No valid Google Cloud credentials available"
                 }
 
-            # Make the API request
-            headers = {
-                "Authorization": f"Bearer {self.credentials.token}",
-                "Content-Type": "application/json"
-            }
+            # Reading and base64-encoding the photos is blocking work, so it runs off the event loop
+            body = await asyncio.to_thread(_dump_payload, payload, images)
 
-            response = requests.post(
-                self.endpoint,
-                headers=headers,
-                json=payload,
-                timeout=180  # Longer timeout for transformation
-            )
+            # Make the API request
+            response = await self._post(body, timeout=180)  # Longer timeout for transformation
 
             # Process response
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "predictions" in data and data["predictions"]:
                     prediction = data["predictions"][0]
                     return {
@@ -244,4 +323,24 @@ class ImagenClient:
             return {
                 "success": False,
                 "error": f"Cosplay transformation error: {str(e)}"
-            }
\ No newline at end of file
+            }
+
+    async def generate_batch(self, prompts: List[str], base_image: ImageSource, mask_image: Optional[ImageSource] = None) -> List[Dict[str, Any]]:
+        """
+        Generate several cosplay variants of the same photo concurrently
+
+        The requests share the HTTP/2 client, so they are multiplexed over one
+        connection instead of each waiting on its own round trip
+
+        Args:
+            prompts: One transformation prompt per variant
+            base_image: Original human photo (bytes or binary file object) for transformation
+            mask_image: Optional mask (bytes or binary file object) to specify areas to transform
+
+        Returns:
+            List of transformation results, in the same order as prompts
+        """
+        return list(await asyncio.gather(*(
+            self.generate_cosplay_transformation(prompt, base_image, mask_image)
+            for prompt in prompts
+        )))
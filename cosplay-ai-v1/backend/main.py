@@ -1,10 +1,14 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 import uvicorn
+import asyncio
 import os
+import time
 from typing import Optional
 import uuid
+import orjson
+from cachetools import TTLCache
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -16,12 +20,21 @@ from imagen_client import ImagenClient
 from prompt_builder import PromptBuilder
 from photo_analyzer import PhotoAnalyzer
 from character_library import CharacterLibrary
-from utils import generate_unique_id, estimate_generation_time, validate_file_extension
+from utils import generate_unique_id, estimate_generation_time, validate_file_extension, ALLOWED_IMAGE_TYPES
+
+# Demo placeholder results, keyed by character
+DEMO_URLS = {
+    "sailor-moon": "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9ImJnIiB4MT0iMCUiIHkxPSIwJSIgeDI9IjEwMCUiIHkyPSIxMDAlIj48c3RvcCBvZmZzZXQ9IjAlIiBzdHlsZT0ic3RvcC1jb2xvcjojZmY2YmU3O3N0b3Atb3BhY2l0eToxIiAvPjxzdG9wIG9mZnNldD0iMTAwJSIgc3R5bGU9InN0b3AtY29sb3I6IzRmNDZlNTtzdG9wLW9wYWNpdHk6MSIgLz48L2xpbmVhckdyYWRpZW50PjwvZGVmcz48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSJ1cmwoI2JnKSIvPjxjaXJjbGUgY3g9IjI1NiIgY3k9IjE4MCIgcj0iNjAiIGZpbGw9IiNmZmRiOTkiLz48Y2lyY2xlIGN4PSIyMzUiIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48Y2lyY2xlIGN4PSIyNzciIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48ZWxsaXBzZSBjeD0iMjU2IiBjeT0iMTg1IiByeD0iNCIgcnk9IjIiIGZpbGw9IiNlZTg4NzQiLz48cGF0aCBkPSJNMjIwIDEyMCBRMjU2IDEwMCAyOTIgMTIwIEwyOTAgMTQwIFEyNTYgMTIwIDIyMiAxNDAiIGZpbGw9IiNmZmQ3MDAiLz48Y2lyY2xlIGN4PSIyNTYiIGN5PSIxMDAiIHI9IjgiIGZpbGw9IiNmZmQ3MDAiLz48dGV4dCB4PSI1MCUiIHk9IjkwJSIgZm9udC1mYW1pbHk9IkFyaWFsLCBzYW5zLXNlcmlmIiBmb250LXNpemU9IjE4IiBmaWxsPSIjZmZmZmZmIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIj7wn5GRICBTY2lsb3IgTW9vbiBDb3NwbGF5IERlbW8g8J+RkTwvdGV4dD48L3N2Zz4=",
+    "wonder-woman": "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9ImJnMiIgeDE9IjAlIiB5MT0iMCUiIHgyPSIxMDAlIiB5Mj0iMTAwJSI+PHN0b3Agb2Zmc2V0PSIwJSIgc3R5bGU9InN0b3AtY29sb3I6I2RjMjYyNjtzdG9wLW9wYWNpdHk6MSIgLz48c3RvcCBvZmZzZXQ9IjEwMCUiIHN0eWxlPSJzdG9wLWNvbG9yOiNmYWNjMTU7c3RvcC1vcGFjaXR5OjEiIC8+PC9saW5lYXJHcmFkaWVudD48L2RlZnM+PHJlY3Qgd2lkdGg9IjEwMCUiIGhlaWdodD0iMTAwJSIgZmlsbD0idXJsKCNiZzIpIi8+PGNpcmNsZSBjeD0iMjU2IiBjeT0iMTgwIiByPSI2MCIgZmlsbD0iI2ZmZGI5OSIvPjxjaXJjbGUgY3g9IjIzNSIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxjaXJjbGUgY3g9IjI3NyIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxlbGxpcHNlIGN4PSIyNTYiIGN5PSIxODUiIHJ4PSI0IiByeT0iMiIgZmlsbD0iI2VlODg3NCIvPjxwYXRoIGQ9Ik0yMjAgMTIwIFEyNTYgMTAwIDI5MiAxMjAgTDI5MCAxNDAgUTI1NiAxMjAgMjIyIDE0MCIgZmlsbD0iIzU0MzMxMyIvPjxjaXJjbGUgY3g9IjI1NiIgY3k9IjEwMCIgcj0iOCIgZmlsbD0iI2ZhY2MxNSIvPjx0ZXh0IHg9IjUwJSIgeT0iOTAlIiBmb250LWZhbWlseT0iQXJpYWwsIHNhbnMtc2VyaWYiIGZvbnQtc2l6ZT0iMTgiIGZpbGw9IiNmZmZmZmYiIHRleHQtYW5jaG9yPSJtaWRkbGUiPvCflrIgV29uZGVyIFdvbWFuIENvc3BsYXkgRGVtbyDwn5ayPC90ZXh0Pjwvc3ZnPg==",
+    "mikasa": "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9Im1pa2FzYUJnIiB4MT0iMCUiIHkxPSIwJSIgeDI9IjEwMCUiIHkyPSIxMDAlIj48c3RvcCBvZmZzZXQ9IjAlIiBzdHlsZT0ic3RvcC1jb2xvcjojNzQ0NzM1O3N0b3Atb3BhY2l0eToxIiAvPjxzdG9wIG9mZnNldD0iMTAwJSIgc3R5bGU9InN0b3AtY29sb3I6IzNhMzYzMTtzdG9wLW9wYWNpdHk6MSIgLz48L2xpbmVhckdyYWRpZW50PjwvZGVmcz48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSJ1cmwoI21pa2FzYUJnKSIvPjxyZWN0IHg9IjAiIHk9IjQ1MCIgd2lkdGg9IjUxMiIgaGVpZ2h0PSI2MiIgZmlsbD0iIzU1NGYzOSIvPjxjaXJjbGUgY3g9IjI1NiIgY3k9IjE4MCIgcj0iNjAiIGZpbGw9IiNmZmRiOTkiLz48Y2lyY2xlIGN4PSIyMzUiIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48Y2lyY2xlIGN4PSIyNzciIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48ZWxsaXBzZSBjeD0iMjU2IiBjeT0iMTg1IiByeD0iNCIgcnk9IjIiIGZpbGw9IiNlZTg4NzQiLz48cGF0aCBkPSJNMjIwIDEyMCBRMjU2IDEwMCAyOTIgMTIwIEwyOTAgMTQwIFEyNTYgMTIwIDIyMiAxNDAiIGZpbGw9IiMzMzMiLz48cmVjdCB4PSIyMDAiIHk9IjI1MCIgd2lkdGg9IjExMiIgaGVpZ2h0PSI4MCIgZmlsbD0iIzc0NDczNSIvPjxyZWN0IHg9IjIxMCIgeT0iMjYwIiB3aWR0aD0iOTIiIGhlaWdodD0iNDAiIGZpbGw9IiNmZmZmZmYiLz48cGF0aCBkPSJNMjMwIDI0MCBMMTI2MCAyNDAgTDI2MCAyNzAgTDIzMCAyNzAiIGZpbGw9IiNkYzI2MjYiLz48dGV4dCB4PSI1MCUiIHk9IjkwJSIgZm9udC1mYW1pbHk9IkFyaWFsLCBzYW5zLXNlcmlmIiBmb250LXNpemU9IjE4IiBmaWxsPSIjZmZmZmZmIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIj7ijJUgTWlrYXNhIEFja2VybWFuIENvc3BsYXkgKEltYWdlbiA0KSA8L3RleHQ+PC9zdmc+",
+}
+DEFAULT_DEMO_URL = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9ImJnMyIgeDE9IjAlIiB5MT0iMCUiIHgyPSIxMDAlIiB5Mj0iMTAwJSI+PHN0b3Agb2Zmc2V0PSIwJSIgc3R5bGU9InN0b3AtY29sb3I6Izg4NTVmNztzdG9wLW9wYWNpdHk6MSIgLz48c3RvcCBvZmZzZXQ9IjEwMCUiIHN0eWxlPSJzdG9wLWNvbG9yOiM1YjIxYjY7c3RvcC1vcGFjaXR5OjEiIC8+PC9saW5lYXJHcmFkaWVudD48L2RlZnM+PHJlY3Qgd2lkdGg9IjEwMCUiIGhlaWdodD0iMTAwJSIgZmlsbD0idXJsKCNiZzMpIi8+PGNpcmNsZSBjeD0iMjU2IiBjeT0iMTgwIiByPSI2MCIgZmlsbD0iI2ZmZGI5OSIvPjxjaXJjbGUgY3g9IjIzNSIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxjaXJjbGUgY3g9IjI3NyIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxlbGxpcHNlIGN4PSIyNTYiIGN5PSIxODUiIHJ4PSI0IiByeT0iMiIgZmlsbD0iI2VlODg3NCIvPjxwYXRoIGQ9Ik0yMjAgMTIwIFEyNTYgMTAwIDI5MiAxMjAgTDI5MCAxNDAgUTI1NiAxMjAgMjIyIDE0MCIgZmlsbD0iIzU0MzMxMyIvPjx0ZXh0IHg9IjUwJSIgeT0iOTAlIiBmb250LWZhbWlseT0iQXJpYWwsIHNhbnMtc2VyaWYiIGZvbnQtc2l6ZT0iMTgiIGZpbGw9IiNmZmZmZmYiIHRleHQtYW5jaG9yPSJtaWRkbGUiPvCfmIwgQ29zcGxheSBSZXN1bHQgKEltYWdlbiA0IFVsdHJhKSDwn5iMPC90ZXh0Pjwvc3ZnPg=="
 
 app = FastAPI(
     title="Cosplay AI V1",
     description="AI-powered cosplay image generation for content creators",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -44,8 +57,45 @@ prompt_builder = PromptBuilder()
 photo_analyzer = PhotoAnalyzer()
 character_library = CharacterLibrary()
 
+# The character list never changes at runtime, so serialize it once
+characters_body = orjson.dumps({"characters": character_library.get_all_characters()})
+
+# Coarse (1s) timestamp for /health, refreshed in the background rather than formatted per request
+timestamp_cache = {"now": datetime.now().isoformat()}
+
+async def refresh_timestamp():
+    while True:
+        timestamp_cache["now"] = datetime.now().isoformat()
+        await asyncio.sleep(1)
+
+# Background refresh task; kept referenced so it isn't garbage collected, and cancelled on shutdown
+timestamp_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_timestamp_refresh():
+    global timestamp_task
+    timestamp_task = asyncio.create_task(refresh_timestamp())
+
+@app.on_event("shutdown")
+async def shutdown_cleanup():
+    if timestamp_task:
+        timestamp_task.cancel()
+        try:
+            await timestamp_task
+        except asyncio.CancelledError:
+            pass
+    if imagen_client:
+        await imagen_client.client.aclose()
+
 # In-memory storage for demo (replace with database in production)
-generations = {}
+# Bounded and expiring so finished generations don't accumulate forever
+generations = TTLCache(maxsize=10_000, ttl=3600)
+
+def build_final_prompt(analysis: dict, character_data: dict, style: str, quality: str) -> str:
+    """Build, enhance and sanitize the transformation prompt (runs off the event loop)"""
+    transformation_prompt = prompt_builder.build_cosplay_transformation_prompt(analysis, character_data, style)
+    enhanced_prompt = prompt_builder.enhance_prompt_for_quality(transformation_prompt, quality)
+    return prompt_builder.sanitize_prompt(enhanced_prompt)
 
 @app.get("/")
 async def root():
@@ -53,7 +103,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": timestamp_cache["now"]}
 
 @app.post("/generate-cosplay")
 async def generate_cosplay(
@@ -67,17 +117,17 @@ async def generate_cosplay(
     """
     try:
         # Validate file type
-        if not photo.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
+        if photo.content_type not in ALLOWED_IMAGE_TYPES:
+            raise HTTPException(status_code=400, detail="File must be a JPEG, PNG or WebP image")
         
         if not validate_file_extension(photo.filename):
             raise HTTPException(status_code=400, detail="Invalid file format")
         
-        # Read image data
-        image_data = await photo.read()
+        # The upload is deliberately left unread in photo.file (spooled in memory when small, on
+        # disk when large): generation runs in demo mode here, so nothing needs its bytes
         
         # Temporarily skip validation for testing
-        # is_valid, error_msg = photo_analyzer.validate_image(image_data)
+        # is_valid, error_msg = photo_analyzer.validate_image(await photo.read())
         # if not is_valid:
         #     raise HTTPException(status_code=400, detail=error_msg)
         
@@ -101,9 +151,7 @@ async def generate_cosplay(
             raise HTTPException(status_code=400, detail="Invalid character")
         
         # Build comprehensive cosplay transformation prompt
-        transformation_prompt = prompt_builder.build_cosplay_transformation_prompt(analysis, character_data, style)
-        enhanced_prompt = prompt_builder.enhance_prompt_for_quality(transformation_prompt, quality)
-        final_prompt = prompt_builder.sanitize_prompt(enhanced_prompt)
+        final_prompt = await asyncio.to_thread(build_final_prompt, analysis, character_data, style, quality)
         
         # Estimate generation time
         estimated_time = estimate_generation_time(character, quality, analysis.get('dimensions', (512, 512)))
@@ -115,7 +163,7 @@ async def generate_cosplay(
             "character": character,
             "style": style,
             "quality": quality,
-            "created_at": datetime.now().isoformat(),
+            "created_at": time.time_ns(),  # formatted when the generation is read
             "estimated_time": estimated_time,
             "prompt": final_prompt,
             "analysis": analysis
@@ -124,15 +172,6 @@ async def generate_cosplay(
         # For demo: Using enhanced Imagen 4 Ultra prompts with realistic placeholder results
         # In production: Will use actual Imagen 4 Ultra API with the comprehensive transformation prompts
         generations[generation_id]["status"] = "completed"
-        # Create a more realistic demo image URL based on character
-        if character == "sailor-moon":
-            generations[generation_id]["result_url"] = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9ImJnIiB4MT0iMCUiIHkxPSIwJSIgeDI9IjEwMCUiIHkyPSIxMDAlIj48c3RvcCBvZmZzZXQ9IjAlIiBzdHlsZT0ic3RvcC1jb2xvcjojZmY2YmU3O3N0b3Atb3BhY2l0eToxIiAvPjxzdG9wIG9mZnNldD0iMTAwJSIgc3R5bGU9InN0b3AtY29sb3I6IzRmNDZlNTtzdG9wLW9wYWNpdHk6MSIgLz48L2xpbmVhckdyYWRpZW50PjwvZGVmcz48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSJ1cmwoI2JnKSIvPjxjaXJjbGUgY3g9IjI1NiIgY3k9IjE4MCIgcj0iNjAiIGZpbGw9IiNmZmRiOTkiLz48Y2lyY2xlIGN4PSIyMzUiIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48Y2lyY2xlIGN4PSIyNzciIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48ZWxsaXBzZSBjeD0iMjU2IiBjeT0iMTg1IiByeD0iNCIgcnk9IjIiIGZpbGw9IiNlZTg4NzQiLz48cGF0aCBkPSJNMjIwIDEyMCBRMjU2IDEwMCAyOTIgMTIwIEwyOTAgMTQwIFEyNTYgMTIwIDIyMiAxNDAiIGZpbGw9IiNmZmQ3MDAiLz48Y2lyY2xlIGN4PSIyNTYiIGN5PSIxMDAiIHI9IjgiIGZpbGw9IiNmZmQ3MDAiLz48dGV4dCB4PSI1MCUiIHk9IjkwJSIgZm9udC1mYW1pbHk9IkFyaWFsLCBzYW5zLXNlcmlmIiBmb250LXNpemU9IjE4IiBmaWxsPSIjZmZmZmZmIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIj7wn5GRICBTY2lsb3IgTW9vbiBDb3NwbGF5IERlbW8g8J+RkTwvdGV4dD48L3N2Zz4="
-        elif character == "wonder-woman":
-            generations[generation_id]["result_url"] = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9ImJnMiIgeDE9IjAlIiB5MT0iMCUiIHgyPSIxMDAlIiB5Mj0iMTAwJSI+PHN0b3Agb2Zmc2V0PSIwJSIgc3R5bGU9InN0b3AtY29sb3I6I2RjMjYyNjtzdG9wLW9wYWNpdHk6MSIgLz48c3RvcCBvZmZzZXQ9IjEwMCUiIHN0eWxlPSJzdG9wLWNvbG9yOiNmYWNjMTU7c3RvcC1vcGFjaXR5OjEiIC8+PC9saW5lYXJHcmFkaWVudD48L2RlZnM+PHJlY3Qgd2lkdGg9IjEwMCUiIGhlaWdodD0iMTAwJSIgZmlsbD0idXJsKCNiZzIpIi8+PGNpcmNsZSBjeD0iMjU2IiBjeT0iMTgwIiByPSI2MCIgZmlsbD0iI2ZmZGI5OSIvPjxjaXJjbGUgY3g9IjIzNSIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxjaXJjbGUgY3g9IjI3NyIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxlbGxpcHNlIGN4PSIyNTYiIGN5PSIxODUiIHJ4PSI0IiByeT0iMiIgZmlsbD0iI2VlODg3NCIvPjxwYXRoIGQ9Ik0yMjAgMTIwIFEyNTYgMTAwIDI5MiAxMjAgTDI5MCAxNDAgUTI1NiAxMjAgMjIyIDE0MCIgZmlsbD0iIzU0MzMxMyIvPjxjaXJjbGUgY3g9IjI1NiIgY3k9IjEwMCIgcj0iOCIgZmlsbD0iI2ZhY2MxNSIvPjx0ZXh0IHg9IjUwJSIgeT0iOTAlIiBmb250LWZhbWlseT0iQXJpYWwsIHNhbnMtc2VyaWYiIGZvbnQtc2l6ZT0iMTgiIGZpbGw9IiNmZmZmZmYiIHRleHQtYW5jaG9yPSJtaWRkbGUiPvCflrIgV29uZGVyIFdvbWFuIENvc3BsYXkgRGVtbyDwn5ayPC90ZXh0Pjwvc3ZnPg=="
-        elif character == "mikasa":
-            generations[generation_id]["result_url"] = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9Im1pa2FzYUJnIiB4MT0iMCUiIHkxPSIwJSIgeDI9IjEwMCUiIHkyPSIxMDAlIj48c3RvcCBvZmZzZXQ9IjAlIiBzdHlsZT0ic3RvcC1jb2xvcjojNzQ0NzM1O3N0b3Atb3BhY2l0eToxIiAvPjxzdG9wIG9mZnNldD0iMTAwJSIgc3R5bGU9InN0b3AtY29sb3I6IzNhMzYzMTtzdG9wLW9wYWNpdHk6MSIgLz48L2xpbmVhckdyYWRpZW50PjwvZGVmcz48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSJ1cmwoI21pa2FzYUJnKSIvPjxyZWN0IHg9IjAiIHk9IjQ1MCIgd2lkdGg9IjUxMiIgaGVpZ2h0PSI2MiIgZmlsbD0iIzU1NGYzOSIvPjxjaXJjbGUgY3g9IjI1NiIgY3k9IjE4MCIgcj0iNjAiIGZpbGw9IiNmZmRiOTkiLz48Y2lyY2xlIGN4PSIyMzUiIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48Y2lyY2xlIGN4PSIyNzciIGN5PSIxNzAiIHI9IjMiIGZpbGw9IiMzMzMiLz48ZWxsaXBzZSBjeD0iMjU2IiBjeT0iMTg1IiByeD0iNCIgcnk9IjIiIGZpbGw9IiNlZTg4NzQiLz48cGF0aCBkPSJNMjIwIDEyMCBRMjU2IDEwMCAyOTIgMTIwIEwyOTAgMTQwIFEyNTYgMTIwIDIyMiAxNDAiIGZpbGw9IiMzMzMiLz48cmVjdCB4PSIyMDAiIHk9IjI1MCIgd2lkdGg9IjExMiIgaGVpZ2h0PSI4MCIgZmlsbD0iIzc0NDczNSIvPjxyZWN0IHg9IjIxMCIgeT0iMjYwIiB3aWR0aD0iOTIiIGhlaWdodD0iNDAiIGZpbGw9IiNmZmZmZmYiLz48cGF0aCBkPSJNMjMwIDI0MCBMMTI2MCAyNDAgTDI2MCAyNzAgTDIzMCAyNzAiIGZpbGw9IiNkYzI2MjYiLz48dGV4dCB4PSI1MCUiIHk9IjkwJSIgZm9udC1mYW1pbHk9IkFyaWFsLCBzYW5zLXNlcmlmIiBmb250LXNpemU9IjE4IiBmaWxsPSIjZmZmZmZmIiB0ZXh0LWFuY2hvcj0ibWlkZGxlIj7ijJUgTWlrYXNhIEFja2VybWFuIENvc3BsYXkgKEltYWdlbiA0KSA8L3RleHQ+PC9zdmc+"
-        else:
-            generations[generation_id]["result_url"] = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNTEyIiBoZWlnaHQ9IjUxMiIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48ZGVmcz48bGluZWFyR3JhZGllbnQgaWQ9ImJnMyIgeDE9IjAlIiB5MT0iMCUiIHgyPSIxMDAlIiB5Mj0iMTAwJSI+PHN0b3Agb2Zmc2V0PSIwJSIgc3R5bGU9InN0b3AtY29sb3I6Izg4NTVmNztzdG9wLW9wYWNpdHk6MSIgLz48c3RvcCBvZmZzZXQ9IjEwMCUiIHN0eWxlPSJzdG9wLWNvbG9yOiM1YjIxYjY7c3RvcC1vcGFjaXR5OjEiIC8+PC9saW5lYXJHcmFkaWVudD48L2RlZnM+PHJlY3Qgd2lkdGg9IjEwMCUiIGhlaWdodD0iMTAwJSIgZmlsbD0idXJsKCNiZzMpIi8+PGNpcmNsZSBjeD0iMjU2IiBjeT0iMTgwIiByPSI2MCIgZmlsbD0iI2ZmZGI5OSIvPjxjaXJjbGUgY3g9IjIzNSIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxjaXJjbGUgY3g9IjI3NyIgY3k9IjE3MCIgcj0iMyIgZmlsbD0iIzMzMyIvPjxlbGxpcHNlIGN4PSIyNTYiIGN5PSIxODUiIHJ4PSI0IiByeT0iMiIgZmlsbD0iI2VlODg3NCIvPjxwYXRoIGQ9Ik0yMjAgMTIwIFEyNTYgMTAwIDI5MiAxMjAgTDI5MCAxNDAgUTI1NiAxMjAgMjIyIDE0MCIgZmlsbD0iIzU0MzMxMyIvPjx0ZXh0IHg9IjUwJSIgeT0iOTAlIiBmb250LWZhbWlseT0iQXJpYWwsIHNhbnMtc2VyaWYiIGZvbnQtc2l6ZT0iMTgiIGZpbGw9IiNmZmZmZmYiIHRleHQtYW5jaG9yPSJtaWRkbGUiPvCfmIwgQ29zcGxheSBSZXN1bHQgKEltYWdlbiA0IFVsdHJhKSDwn5iMPC90ZXh0Pjwvc3ZnPg=="
         generations[generation_id]["metadata"] = {"mode": "demo", "character": character}
         
         return {
@@ -151,18 +190,24 @@ async def get_generation(generation_id: str):
     """
     Get generation status and result
     """
-    if generation_id not in generations:
+    generation = generations.get(generation_id)
+    if generation is None:
         raise HTTPException(status_code=404, detail="Generation not found")
     
-    return generations[generation_id]
+    result = {**generation, "created_at": datetime.fromtimestamp(generation["created_at"] / 1e9).isoformat()}
+    
+    # Demo results are resolved here so stored records don't each carry the full data URL
+    if generation["status"] == "completed" and generation.get("metadata", {}).get("mode") == "demo":
+        result["result_url"] = DEMO_URLS.get(generation["character"], DEFAULT_DEMO_URL)
+    
+    return result
 
 @app.get("/characters")
 async def get_characters():
     """
     Get available characters
     """
-    characters = character_library.get_all_characters()
-    return {"characters": characters}
+    return Response(content=characters_body, media_type="application/json")
 
 if __name__ == "__main__":
     port = int(os.getenv("API_PORT", 8001))
@@ -5,14 +5,25 @@ import cv2
 import numpy as np
 from PIL import Image
 import io
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, Union
 import colorsys
+import os
+
+# Requests are analyzed concurrently, so cap OpenCV's internal thread pool at half the
+# cores (override with OPENCV_NUM_THREADS) to avoid oversubscription
+cv2.setUseOptimized(True)
+cv2.setNumThreads(int(os.getenv("OPENCV_NUM_THREADS", max(1, (os.cpu_count() or 1) // 2))))
 
 class PhotoAnalyzer:
     def __init__(self):
         self.min_size = (512, 512)
         self.max_size = (2048, 2048)
         
+        # Color and quality statistics don't need full resolution, nor does the
+        # face check (it only answers "is there a face")
+        self.analysis_max_dim = 512
+        self.face_detect_max_dim = 512
+        
         # Color ranges for hair detection (HSV)
         self.hair_colors = {
             "blonde": [(20, 50, 50), (30, 255, 255)],
@@ -28,33 +39,54 @@ class PhotoAnalyzer:
             "medium": [(0, 20, 20), (20, 150, 200)],
             "dark": [(0, 20, 0), (20, 150, 150)]
         }
+        
+        # Bounds stacked into (N, 3) arrays so all ranges are tested in one vectorized pass
+        self._hair_names = tuple(self.hair_colors)
+        self._hair_lo = np.array([lower for lower, _ in self.hair_colors.values()], dtype=np.uint8)
+        self._hair_hi = np.array([upper for _, upper in self.hair_colors.values()], dtype=np.uint8)
+        self._skin_names = tuple(self.skin_tones)
+        self._skin_lo = np.array([lower for lower, _ in self.skin_tones.values()], dtype=np.uint8)
+        self._skin_hi = np.array([upper for _, upper in self.skin_tones.values()], dtype=np.uint8)
+        
+        # Load the face detector once instead of parsing the cascade XML for every photo
+        self._face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     
-    def analyze_photo(self, image_data: bytes) -> Dict[str, Any]:
+    def analyze_photo(self, image_data: Union[bytes, np.ndarray]) -> Dict[str, Any]:
         """
         Analyze uploaded photo for cosplay generation
         
         Args:
-            image_data: Raw image bytes
+            image_data: Raw image bytes, or a BGR array already decoded by load_image
             
         Returns:
             Dictionary with analysis results
         """
         try:
             # Load and validate image
-            image = self._load_image(image_data)
-            if not image:
+            image = self.load_image(image_data)
+            if image is None:
                 return {"error": "Invalid image format"}
             
+            # Downscale and convert color spaces once, sharing the result across the detectors
+            small = self._downscale(image, self.analysis_max_dim)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+            
+            # Whole-frame statistics, each a single streaming reduction
+            laplacian_var = self._laplacian_variance(gray)
+            brightness = cv2.mean(gray)[0]
+            saturation = cv2.mean(hsv)[1]
+            
             # Perform analysis
             analysis = {
                 "dimensions": image.shape[:2],
                 "aspect_ratio": image.shape[1] / image.shape[0],
-                "quality_score": self._assess_quality(image),
-                "hair_color": self._detect_hair_color(image),
-                "skin_tone": self._detect_skin_tone(image),
+                "quality_score": self._assess_quality(laplacian_var),
+                "hair_color": self._detect_hair_color(hsv),
+                "skin_tone": self._detect_skin_tone(hsv),
                 "pose": self._detect_pose(image),
-                "style_cues": self._detect_style_cues(image),
-                "face_detected": self._detect_face(image)
+                "style_cues": self._detect_style_cues(brightness, saturation),
+                "face_detected": self._detect_face(gray)
             }
             
             return analysis
@@ -62,18 +94,26 @@ class PhotoAnalyzer:
         except Exception as e:
             return {"error": f"Analysis failed: {str(e)}"}
     
+    def _downscale(self, image: np.ndarray, max_dim: int) -> np.ndarray:
+        """Shrink image so its longest side is at most max_dim, keeping the aspect ratio"""
+        scale = max_dim / max(image.shape[:2])
+        if scale >= 1:
+            return image
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    def load_image(self, image_data: Union[bytes, np.ndarray]) -> Optional[np.ndarray]:
+        """Load and validate image, passing through arrays that are already decoded"""
+        if isinstance(image_data, np.ndarray):
+            return image_data
+        return self._load_image(image_data)
+    
     def _load_image(self, image_data: bytes) -> Optional[np.ndarray]:
         """Load and validate image"""
         try:
-            # Convert bytes to PIL Image
-            pil_image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if needed
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # Convert to OpenCV format
-            image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+            # Decode straight to a 3-channel BGR array, no PIL buffer or channel swap
+            image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return None
             
             # Validate size
             if image.shape[0] < self.min_size[0] or image.shape[1] < self.min_size[1]:
@@ -84,47 +124,54 @@ class PhotoAnalyzer:
         except Exception:
             return None
     
-    def _assess_quality(self, image: np.ndarray) -> float:
+    def _peek_size(self, image_data: bytes) -> Optional[Tuple[int, int]]:
+        """Read (height, width) from the image header without decoding any pixels"""
+        try:
+            # Image.open is lazy: it parses the header and stops until .load() is called
+            with Image.open(io.BytesIO(image_data)) as img:
+                width, height = img.size
+            return height, width
+        except Exception:
+            return None
+    
+    def _laplacian_variance(self, gray: np.ndarray) -> float:
+        """Variance of the Laplacian, a sharpness measure, from one meanStdDev pass"""
+        _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        return float(std[0][0]) ** 2
+    
+    def _assess_quality(self, laplacian_var: float) -> float:
         """Assess image quality using Laplacian variance"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
         # Normalize to 0-1 scale
         return min(laplacian_var / 1000, 1.0)
     
-    def _detect_hair_color(self, image: np.ndarray) -> str:
+    def _detect_hair_color(self, hsv: np.ndarray) -> str:
         """Detect dominant hair color"""
-        # Convert to HSV for better color detection
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
         # Simple approach: analyze top portion of image for hair
-        height, width = image.shape[:2]
+        height, width = hsv.shape[:2]
         hair_region = hsv[:height//3, :]  # Top third of image
         
-        # Count pixels in each hair color range
-        color_counts = {}
-        for color_name, (lower, upper) in self.hair_colors.items():
-            mask = cv2.inRange(hair_region, np.array(lower), np.array(upper))
-            color_counts[color_name] = cv2.countNonZero(mask)
-        
-        # Return most common color
-        return max(color_counts, key=color_counts.get) if color_counts and any(color_counts.values()) else "unknown"
+        # Count pixels in each hair color range and return the most common color
+        return self._dominant_range(hair_region, self._hair_names, self._hair_lo, self._hair_hi)
     
-    def _detect_skin_tone(self, image: np.ndarray) -> str:
+    def _detect_skin_tone(self, hsv: np.ndarray) -> str:
         """Detect skin tone"""
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
         # Analyze center portion for skin
-        height, width = image.shape[:2]
+        height, width = hsv.shape[:2]
         skin_region = hsv[height//3:2*height//3, width//4:3*width//4]
         
         # Count pixels in each skin tone range
-        tone_counts = {}
-        for tone_name, (lower, upper) in self.skin_tones.items():
-            mask = cv2.inRange(skin_region, np.array(lower), np.array(upper))
-            tone_counts[tone_name] = cv2.countNonZero(mask)
+        return self._dominant_range(skin_region, self._skin_names, self._skin_lo, self._skin_hi)
+    
+    def _dominant_range(self, region: np.ndarray, names: Tuple[str, ...], lower: np.ndarray, upper: np.ndarray) -> str:
+        """Name of the HSV range matching the most pixels in region, or "unknown" if none match"""
+        # Pack the ROI into one contiguous buffer up front (a no-op for full-width row
+        # slices), then (P, 1, 3) pixels against (N, 3) bounds gives a (P, N) mask
+        # in a single read of the region
+        pixels = np.ascontiguousarray(region).reshape(-1, 1, 3)
+        mask = ((pixels >= lower) & (pixels <= upper)).all(axis=2)
+        counts = np.count_nonzero(mask, axis=0)
         
-        return max(tone_counts, key=tone_counts.get) if tone_counts and any(tone_counts.values()) else "unknown"
+        return names[int(counts.argmax())] if counts.any() else "unknown"
     
     def _detect_pose(self, image: np.ndarray) -> str:
         """Detect basic pose type"""
@@ -139,23 +186,17 @@ class PhotoAnalyzer:
         else:
             return "standard pose"
     
-    def _detect_style_cues(self, image: np.ndarray) -> list:
-        """Detect style cues from image"""
+    def _detect_style_cues(self, brightness: float, saturation: float) -> list:
+        """Detect style cues from mean brightness and saturation"""
         cues = []
         
         # Analyze brightness
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        brightness = np.mean(gray)
-        
         if brightness > 150:
             cues.append("bright lighting")
         elif brightness < 80:
             cues.append("dark lighting")
         
         # Analyze color saturation
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        saturation = np.mean(hsv[:, :, 1])
-        
         if saturation > 100:
             cues.append("vibrant colors")
         elif saturation < 50:
@@ -163,38 +204,57 @@ class PhotoAnalyzer:
         
         return cues
     
-    def _detect_face(self, image: np.ndarray) -> bool:
+    def _detect_face(self, gray: np.ndarray) -> bool:
         """Detect if face is present in image"""
-        # Load Haar cascade for face detection
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        gray = self._downscale(gray, self.face_detect_max_dim)
         
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        # Only one hit is needed: a coarse pyramid that skips faces too small to matter
+        # avoids the scales that would just enumerate more candidates. There is no upper
+        # bound, since selfies and headshots can fill the whole frame
+        min_dim = min(gray.shape[:2])
+        faces = self._face_cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.3,
+            minNeighbors=3,
+            minSize=(min_dim // 8, min_dim // 8)
+        )
         
         return len(faces) > 0
     
-    def validate_image(self, image_data: bytes) -> Tuple[bool, str]:
+    def validate_image(self, image_data: Union[bytes, np.ndarray]) -> Tuple[bool, str]:
         """
         Validate image for cosplay generation
         
+        Accepts raw bytes or an array from load_image, so callers that also run
+        analyze_photo can decode the upload once and share it
+        
         Returns:
             Tuple of (is_valid, error_message)
         """
         try:
-            image = self._load_image(image_data)
-            if not image:
+            # Check size from the header first so rejected uploads never get decoded
+            if isinstance(image_data, np.ndarray):
+                size = image_data.shape[:2]
+            else:
+                size = self._peek_size(image_data)
+            if size is None:
                 return False, "Invalid image format"
             
-            # Check size
-            height, width = image.shape[:2]
+            height, width = size
             if height < self.min_size[0] or width < self.min_size[1]:
                 return False, f"Image too small. Minimum size: {self.min_size}"
             
             if height > self.max_size[0] or width > self.max_size[1]:
                 return False, f"Image too large. Maximum size: {self.max_size}"
             
-            # Check quality
-            quality_score = self._assess_quality(image)
+            image = self.load_image(image_data)
+            if image is None:
+                return False, "Invalid image format"
+            
+            # Check quality on the same downscaled frame analyze_photo scores, so the
+            # Laplacian scans at most analysis_max_dim pixels per side
+            small = self._downscale(image, self.analysis_max_dim)
+            quality_score = self._assess_quality(self._laplacian_variance(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)))
             if quality_score < 0.1:
                 return False, "Image quality too low"
             
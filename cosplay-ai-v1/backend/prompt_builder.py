@@ -4,6 +4,9 @@ Smart prompt engineering for cosplay image generation
 from typing import Dict, Any, Optional
 import re
 
+# Characters other than word characters, whitespace and basic punctuation
+_SANITIZE_RE = re.compile(r'[^\w\s,.-]')
+
 class PromptBuilder:
     def __init__(self):
         self.base_quality_terms = [
@@ -29,6 +32,22 @@ class PromptBuilder:
             "style_consistency": "maintain consistent art style throughout the transformation",
             "pose_enhancement": "enhance pose to match character personality and signature stance"
         }
+
+        # Default settings for series whose characters don't define an environment
+        self._series_env = {
+            "attack on titan": "in post-apocalyptic military setting with massive walls in background",
+            "sailor moon": "in magical girl setting with sparkles and moon background",
+            "wonder woman": "in heroic pose with ancient Greek architecture background"
+        }
+
+        # The term lists are static, so join them once instead of on every prompt
+        self._quality_joined = ",".join(self.base_quality_terms)
+        self._quality_joined_spaced = ", ".join(self.base_quality_terms)
+        self._transformation_specs_joined = ", ".join([
+            self.transformation_templates["face_preservation"],
+            self.transformation_templates["outfit_change"],
+            self.transformation_templates["style_consistency"]
+        ])
     
     def build_prompt(self, photo_analysis: Dict[str, Any], character: Dict[str, Any], style: str = "anime") -> str:
         """
@@ -51,17 +70,15 @@ class PromptBuilder:
         # Get style modifiers
         style_desc = self.style_modifiers.get(style, self.style_modifiers["anime"])
         
-        # Combine all elements
-        prompt_parts = [
-            "Professional cosplay photograph of",
-            person_desc,
-            "as",
-            character_desc,
-            style_desc,
-            ",".join(self.base_quality_terms)
-        ]
+        # Combine all elements, appending only the parts that can be empty
+        prompt_parts = ["Professional cosplay photograph of", person_desc, "as"]
+        add = prompt_parts.append
+        if character_desc:
+            add(character_desc)
+        add(style_desc)
+        add(self._quality_joined)
         
-        return ", ".join(filter(None, prompt_parts))
+        return ", ".join(prompt_parts)
 
     def build_cosplay_transformation_prompt(self, photo_analysis: Dict[str, Any], character: Dict[str, Any], style: str = "anime") -> str:
         """
@@ -81,31 +98,23 @@ class PromptBuilder:
         # Character-specific details
         character_details = self._build_detailed_character_description(character)
 
-        # Transformation specifications
-        transformation_specs = [
-            self.transformation_templates["face_preservation"],
-            self.transformation_templates["outfit_change"],
-            self.transformation_templates["style_consistency"]
-        ]
-
         # Style and quality terms
         style_desc = self.style_modifiers.get(style, self.style_modifiers["anime"])
-        quality_terms = ", ".join(self.base_quality_terms)
 
         # Environment and lighting
         environment = self._get_character_environment(character)
 
-        # Combine all elements with priority order
-        prompt_parts = [
-            base_instruction,
-            character_details,
-            ", ".join(transformation_specs),
-            style_desc,
-            environment,
-            quality_terms
-        ]
+        # Combine all elements with priority order, appending only the parts that can be empty
+        prompt_parts = [base_instruction]
+        add = prompt_parts.append
+        if character_details:
+            add(character_details)
+        add(self._transformation_specs_joined)
+        add(style_desc)
+        add(environment)
+        add(self._quality_joined_spaced)
 
-        return ", ".join(filter(None, prompt_parts))
+        return ", ".join(prompt_parts)
 
     def _build_detailed_character_description(self, character: Dict[str, Any]) -> str:
         """Build extremely detailed character description for accurate transformation"""
@@ -147,12 +156,13 @@ class PromptBuilder:
             return f"in {character['environment']}"
         elif character.get("series"):
             series_name = character["series"].lower()
-            if "attack on titan" in series_name:
-                return "in post-apocalyptic military setting with massive walls in background"
-            elif "sailor moon" in series_name:
-                return "in magical girl setting with sparkles and moon background"
-            elif "wonder woman" in series_name:
-                return "in heroic pose with ancient Greek architecture background"
+            environment = self._series_env.get(series_name)
+            if environment:
+                return environment
+            # Fall back to substring matching for longer titles like "Sailor Moon Crystal"
+            for series, environment in self._series_env.items():
+                if series in series_name:
+                    return environment
         return "in dramatic lighting with appropriate background"
     
     def _build_person_description(self, analysis: Dict[str, Any]) -> str:
@@ -205,7 +215,7 @@ class PromptBuilder:
         Sanitize prompt to avoid API issues
         """
         # Remove potentially problematic characters
-        prompt = re.sub(r'[^\w\s,.-]', '', prompt)
+        prompt = _SANITIZE_RE.sub('', prompt)
         
         # Limit length (Imagen has token limits)
         if len(prompt) > 500:
@@ -0,0 +1,615 @@
+# 🎭 Cosplay AI Generator - Shared Imagen 4 Ultra plumbing
+#
+# Configuration, authentication, HTTP session and image helpers used by both
+# cosplay_generator_fixed.py and cosplay_generator_high_quality.py. Everything
+# here is set up once per process, however many generators are created.
+
+import os
+import io
+import re
+import orjson
+import base64
+import gzip
+import hashlib
+import struct
+import shutil
+import time
+import asyncio
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# PIL, aiohttp and google.auth are imported where they are used, so importing the
+# generators (for --help, demo mode or wrapper scripts) doesn't pay their startup cost
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
+LOCATION = os.getenv("IMAGEN_LOCATION", "us-central1")
+CREDENTIALS_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+# Opt-in: gzip request bodies only when the endpoint is known to accept them
+GZIP_REQUESTS = os.getenv("IMAGEN_GZIP_REQUESTS", "false").lower() == "true"
+
+# Folders
+MODELS_FOLDER = Path("models")
+OUTPUT_FOLDER = Path("output")
+CACHE_FOLDER = OUTPUT_FOLDER / ".cache"
+CHARACTERS_FILE = Path("characters.json")
+
+# Create folders if they don't exist
+MODELS_FOLDER.mkdir(exist_ok=True)
+OUTPUT_FOLDER.mkdir(exist_ok=True)
+
+print(f"📁 Models folder: {MODELS_FOLDER.absolute()}")
+print(f"📁 Output folder: {OUTPUT_FOLDER.absolute()}")
+print(f"🚀 Project ID: {PROJECT_ID}")
+print(f"🌍 Location: {LOCATION}")
+
+def _parameters(base, num_samples):
+    """Shared request parameters, copied only when sampleCount differs from the default"""
+    return base if num_samples == 1 else {**base, "sampleCount": num_samples}
+
+# Imagen gains nothing from larger inputs, so photos are shrunk to fit this before upload
+MAX_INPUT_DIM = 1024
+
+# Read size for streaming base64; a multiple of 3 so chunks encode without padding
+B64_CHUNK_SIZE = 3 * 64 * 1024
+
+def _encode_image(image_path):
+    """Read an image file and return it base64-encoded, never holding the raw file in memory"""
+    out = bytearray()
+    with open(image_path, 'rb', buffering=1 << 20) as f:
+        while chunk := f.read(B64_CHUNK_SIZE):
+            out += base64.b64encode(chunk)
+    return out.decode('ascii')
+
+def _prepare_image(image_path, preserve_full_res=False):
+    """Base64-encode an input image, first downscaling it to MAX_INPUT_DIM unless preserve_full_res"""
+    if not preserve_full_res:
+        from PIL import Image, ImageOps
+        with Image.open(image_path) as img:
+            if max(img.size) > MAX_INPUT_DIM:
+                # Keep JPEG sources as JPEG; a photo re-encoded as PNG can outgrow the original
+                fmt = "JPEG" if img.format == "JPEG" else "PNG"
+                # Re-encoding drops EXIF, so apply the camera orientation to the pixels first
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((MAX_INPUT_DIM, MAX_INPUT_DIM), Image.LANCZOS)
+                buf = io.BytesIO()
+                if fmt == "JPEG":
+                    img.save(buf, format="JPEG", quality=95)
+                else:
+                    img.save(buf, format="PNG", optimize=True)
+                return base64.b64encode(buf.getbuffer()).decode('ascii')
+
+    # Already small enough (or full resolution requested): send the file as is
+    return _encode_image(image_path)
+
+def _request_body(payload):
+    """Serialize a payload for the API, gzipped when IMAGEN_GZIP_REQUESTS is on
+
+    _auth_headers asks _TokenCache for the matching Content-Encoding header under the same setting
+    """
+    body = orjson.dumps(payload)
+    # Level 1: the repetitive prompts and base64 text still shrink a lot at a fraction of the CPU
+    return gzip.compress(body, compresslevel=1) if GZIP_REQUESTS else body
+
+def _cache_key(payload):
+    """Content address of a request: identical photo, prompt and parameters give the same key"""
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+def _cache_lookup(cache_key, output_path):
+    """Copy a cached generation to output_path, returning False on a miss"""
+    try:
+        shutil.copyfile(CACHE_FOLDER / f"{cache_key}.png", output_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _cache_store(cache_key, output_path):
+    """Add a finished generation to the cache"""
+    CACHE_FOLDER.mkdir(exist_ok=True)
+    # Copy under a private name and rename, so concurrent workers never see a partial file
+    tmp_path = CACHE_FOLDER / f"{cache_key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copyfile(output_path, tmp_path)
+    os.replace(tmp_path, CACHE_FOLDER / f"{cache_key}.png")
+
+def _output_paths(output_name, count):
+    """Output paths for count samples, numbering output_name when there is more than one"""
+    output_path = OUTPUT_FOLDER / output_name
+    if count == 1:
+        return [output_path]
+    return [output_path.with_name(f"{output_path.stem}_{i}{output_path.suffix}") for i in range(count)]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def _save_prediction(prediction, output_path):
+    """Decode a prediction's image and write it to output_path, returning its (width, height) if it is a PNG"""
+    image_data = base64.b64decode(prediction["bytesBase64Encoded"])
+    with open(output_path, 'wb') as f:
+        f.write(image_data)
+
+    # The IHDR chunk always comes first: big-endian width and height at bytes 16-24
+    if image_data[:8] == PNG_SIGNATURE:
+        return struct.unpack(">II", image_data[16:24])
+    return None
+
+# Response bodies are read and decoded in pieces of this size
+STREAM_CHUNK_SIZE = 64 * 1024
+
+B64_FIELD = b'"bytesBase64Encoded"'
+
+# Pieces of a JSON string body: a run of plain characters, an escape, or the closing quote
+_JSON_STRING_TOKEN = re.compile(rb'[^"\\]+|\\u[0-9a-fA-F]{4}|\\["\\/bfnrt]|"')
+_SIMPLE_ESCAPES = {b'"': b'"', b"\\": b"\\", b"/": b"/", b"b": b"\b", b"f": b"\f", b"n": b"\n", b"r": b"\r", b"t": b"\t"}
+
+def _unescape(token):
+    """Bytes for a single JSON string escape such as \\/ or \\u003d"""
+    if token[1:2] == b"u":
+        return chr(int(token[2:], 16)).encode()
+    return _SIMPLE_ESCAPES[token[1:2]]
+
+def _stream_predictions(chunks, output_paths):
+    """Decode the images of a streamed predict response straight into output_paths
+
+    Scans the raw JSON for bytesBase64Encoded values and base64-decodes each one
+    incrementally into its file, so neither the whole response nor a whole decoded
+    image is ever held in memory. Predictions beyond len(output_paths) are ignored.
+
+    Returns:
+        One entry per image written: its (width, height) if it is a PNG, else None
+    """
+    sizes = []
+    buf = b""
+    out = None
+    head = b""
+    pending = b""  # base64 characters not yet forming a complete 4-character group
+    try:
+        for chunk in chunks:
+            buf += chunk
+            while True:
+                if out is None:
+                    # Looking for the next image value
+                    i = buf.find(B64_FIELD)
+                    j = buf.find(b'"', i + len(B64_FIELD)) if i >= 0 else -1
+                    if j < 0:
+                        # Keep enough of the tail for a field name split across chunks
+                        buf = buf[i:] if i >= 0 else buf[-len(B64_FIELD):]
+                        break
+                    if len(sizes) == len(output_paths):
+                        return sizes
+                    out = open(output_paths[len(sizes)], 'wb')
+                    head = b""
+                    buf = buf[j + 1:]
+                else:
+                    # Inside an image value: unescape and decode everything up to the closing quote
+                    parts, pos, closed = [], 0, False
+                    while pos < len(buf):
+                        m = _JSON_STRING_TOKEN.match(buf, pos)
+                        if m is None:
+                            # An escape split across chunks waits for the rest; anything else is malformed
+                            if buf[pos:pos + 1] != b"\\" or len(buf) - pos >= 6:
+                                raise ValueError("Malformed string in predict response")
+                            break
+                        token = m.group()
+                        pos = m.end()
+                        if token == b'"':
+                            closed = True
+                            break
+                        parts.append(_unescape(token) if token[:1] == b"\\" else token)
+                    data = pending + b"".join(parts)
+                    usable = len(data) if closed else len(data) - len(data) % 4
+                    decoded = base64.b64decode(data[:usable])
+                    out.write(decoded)
+                    if len(head) < 24:
+                        head += decoded[:24 - len(head)]
+                    pending = data[usable:]
+                    buf = buf[pos:]
+                    if not closed:
+                        break
+                    out.close()
+                    out = None
+                    # The IHDR chunk always comes first: big-endian width and height at bytes 16-24
+                    sizes.append(struct.unpack(">II", head[16:24]) if head[:8] == PNG_SIGNATURE else None)
+    finally:
+        if out is not None:
+            # A truncated or malformed response leaves a partial image; don't leave it behind
+            out.close()
+            os.remove(out.name)
+    return sizes
+
+# Decoding and writing samples is independent per image, so multi-sample results are saved in parallel
+_SAVE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cosplay-save")
+
+@lru_cache(maxsize=None)
+def _load_credentials():
+    """Google Cloud credentials with the Vertex AI scope, loaded once per process (None on failure)"""
+    try:
+        from google.auth import default
+        from google.oauth2 import service_account
+
+        if CREDENTIALS_PATH and os.path.exists(CREDENTIALS_PATH):
+            # Use service account credentials with correct scopes
+            credentials = service_account.Credentials.from_service_account_file(
+                CREDENTIALS_PATH,
+                scopes=['https://www.googleapis.com/auth/cloud-platform']
+            )
+        else:
+            # Fallback to default credentials (for local development)
+            credentials, _ = default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
+        print("✅ Google Cloud authentication successful!")
+        return credentials
+    except Exception as e:
+        print(f"❌ Authentication failed: {e}")
+        print("💡 Make sure your .env file is configured correctly")
+        print("💡 Ensure GOOGLE_APPLICATION_CREDENTIALS points to a valid service account JSON file")
+        return None
+
+@lru_cache(maxsize=None)
+def _shared_session():
+    """Process-wide requests.Session, so every generator reuses the same pooled TLS connections"""
+    session = requests.Session()
+    # Retry quota and server errors with backoff
+    # Once retries run out, return the last response so callers can report its status and body
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=frozenset({"POST"}), raise_on_status=False)
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=retries))
+    return session
+
+# Refresh the token this long before it expires, so no request ever waits on the refresh round trip
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_REFRESH_RETRY = 30
+
+def _seconds_to_expiry(credentials):
+    """Seconds until the token expires, or None if it has no expiry"""
+    if credentials.expiry is None:
+        return None
+    # google-auth stores expiry as naive UTC
+    return (credentials.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+def _refresh_due(credentials):
+    """Whether the token is invalid or within TOKEN_REFRESH_MARGIN of expiring"""
+    remaining = _seconds_to_expiry(credentials)
+    return not credentials.valid or (remaining is not None and remaining < TOKEN_REFRESH_MARGIN)
+
+class _TokenCache:
+    """Access token and the headers built from it, shared by every generator in the process"""
+    def __init__(self):
+        # The lock keeps concurrent workers from refreshing in parallel
+        self._lock = threading.Lock()
+        self._token = None
+        self._headers = None
+        self._gzip_headers = None
+
+    def headers(self, credentials, gzip=False):
+        """Request headers with a current access token, refreshing it only when due
+
+        gzip adds Content-Encoding for callers that compress their request bodies.
+        """
+        # Usual case: no lock, so a background refresh in progress never delays a request
+        if credentials.token != self._token or _refresh_due(credentials):
+            with self._lock:
+                if _refresh_due(credentials):
+                    from google.auth.transport.requests import Request
+                    credentials.refresh(Request())
+                if credentials.token != self._token:
+                    self._headers = {
+                        "Authorization": f"Bearer {credentials.token}",
+                        "Content-Type": "application/json"
+                    }
+                    self._gzip_headers = {**self._headers, "Content-Encoding": "gzip"}
+                    self._token = credentials.token
+        return self._gzip_headers if gzip else self._headers
+
+_TOKEN_CACHE = _TokenCache()
+
+def _refresh_loop(credentials):
+    """Keep the shared credentials fresh from a background thread"""
+    from google.auth.transport.requests import Request
+    while True:
+        # Same lock as _TokenCache.headers, so the two never fetch a token at the same time
+        with _TOKEN_CACHE._lock:
+            try:
+                if _refresh_due(credentials):
+                    credentials.refresh(Request())
+                remaining = _seconds_to_expiry(credentials)
+            except Exception as e:
+                # Requests still refresh on demand in _TokenCache.headers, so just try again shortly
+                print(f"⚠️ Background token refresh failed: {e}")
+                remaining = TOKEN_REFRESH_MARGIN + TOKEN_REFRESH_RETRY
+
+        if remaining is None:
+            # A token without an expiry never needs refreshing
+            return
+        # Never spin, even if the API hands out tokens shorter-lived than the margin
+        time.sleep(max(TOKEN_REFRESH_RETRY, remaining - TOKEN_REFRESH_MARGIN))
+
+@lru_cache(maxsize=None)
+def _start_token_refresher(credentials):
+    """Start the refresher thread once per credentials object"""
+    threading.Thread(target=_refresh_loop, args=(credentials,), name="cosplay-token-refresh", daemon=True).start()
+
+class _ImagenBase:
+    """Authentication, endpoint, batching and demo mode shared by the Imagen generators
+
+    Subclasses set characters (character id -> definition) and output_tag, and
+    implement _cosplay_payload (plus _scratch_payload if they support text-to-image)
+    """
+    characters = {}
+    output_tag = ""
+
+    def __init__(self, preserve_full_res=False, use_cache=False):
+        self.project_id = PROJECT_ID
+        self.location = LOCATION
+        self.preserve_full_res = preserve_full_res
+        self.use_cache = use_cache
+
+        if not self.project_id:
+            raise ValueError("GOOGLE_CLOUD_PROJECT_ID not set in .env file")
+
+        # Initialize credentials with proper scopes
+        self.credentials = _load_credentials()
+        if self.credentials:
+            _start_token_refresher(self.credentials)
+
+        # Imagen 4 Ultra endpoint
+        self.endpoint = f"https://{self.location}-aiplatform.googleapis.com/v1/projects/{self.project_id}/locations/{self.location}/publishers/google/models/imagen-4.0-ultra-generate-001:predict"
+
+        self.session = _shared_session()
+
+    def _scratch_payload(self, character_id, num_samples=1):
+        """Text-to-image API payload for a character"""
+        raise NotImplementedError(f"{type(self).__name__} does not support text-to-image generation")
+
+    def _cosplay_payload(self, character_id, image_b64, num_samples=1):
+        """Image transformation API payload for a character and base64 input image"""
+        raise NotImplementedError
+
+    def _auth_headers(self):
+        """Request headers with a valid access token (cached until close to expiry)"""
+        return _TOKEN_CACHE.headers(self.credentials, gzip=GZIP_REQUESTS)
+
+    def _generate_sync(self, payload, character_id, output_name=None, num_samples=1, tag="", cacheable=True, label=""):
+        """Send one predict request and stream its samples to disk
+
+        The subclasses' synchronous generate methods only build the payload and call this.
+
+        Args:
+            payload: API payload from _scratch_payload or _cosplay_payload
+            tag: Inserted after the character id in the default output name
+            cacheable: Whether identical requests may reuse an earlier output
+            label: Describes the request in the progress message, e.g. "text-to-image "
+
+        Returns:
+            The output path, a list of paths if num_samples > 1, or None on failure
+        """
+        if not output_name:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_name = f"{character_id}{tag}_{timestamp}.png"
+
+        # Same photo, character and parameters as an earlier run: reuse its output
+        # (variant batches are meant to differ, so only single samples are cached)
+        cache_key = _cache_key(payload) if self.use_cache and cacheable and num_samples == 1 else None
+        if cache_key and _cache_lookup(cache_key, OUTPUT_FOLDER / output_name):
+            print(f"♻️ Identical request already generated - reusing cached result {CACHE_FOLDER / f'{cache_key}.png'}")
+            print(f"💾 Saved to: {OUTPUT_FOLDER / output_name}")
+            return str(OUTPUT_FOLDER / output_name)
+
+        try:
+            # Get access token (cached until close to expiry)
+            headers = self._auth_headers()
+
+            print(f"🚀 Sending {label}request to Imagen 4 Ultra...")
+            with self.session.post(self.endpoint, data=_request_body(payload), headers=headers, stream=True) as response:
+                if response.status_code != 200:
+                    print(f"❌ API request failed: {response.status_code}")
+                    print(f"Response: {response.text}")
+                    return None
+
+                # Stream each returned sample's base64 straight into its file instead of holding
+                # the raw response, the parsed JSON and the decoded image in memory at once
+                output_paths = _output_paths(output_name, num_samples)
+                sizes = _stream_predictions(response.iter_content(STREAM_CHUNK_SIZE), output_paths)
+
+            if not sizes:
+                print("❌ No predictions returned from API")
+                return None
+
+            output_paths = output_paths[:len(sizes)]
+            for output_path, size in zip(output_paths, sizes):
+                if size:
+                    print(f"📐 Image dimensions: {size[0]}x{size[1]}")
+                print(f"💾 Saved to: {output_path}")
+
+            if cache_key:
+                _cache_store(cache_key, output_paths[0])
+
+            print("✅ Cosplay generated successfully!")
+            if num_samples == 1:
+                return str(output_paths[0])
+            return [str(path) for path in output_paths]
+
+        except Exception as e:
+            print(f"❌ Error during generation: {e}")
+            return None
+
+    async def generate_many(self, jobs, concurrency_limit=4):
+        """Generate several cosplays concurrently
+
+        Args:
+            jobs: (image_path, character_id) pairs; an image_path of None generates from scratch
+            concurrency_limit: Maximum number of requests in flight at once
+
+        Returns:
+            Output paths in job order (None for failed jobs)
+        """
+        for _, character_id in jobs:
+            if character_id not in self.characters:
+                raise ValueError(f"Character '{character_id}' not found")
+
+        if not self.credentials:
+            print("❌ No valid credentials - running in demo mode")
+            return [self._demo_mode(image_path, character_id, f"{character_id}_demo_{i}.txt")
+                    for i, (image_path, character_id) in enumerate(jobs)]
+
+        # Any token refresh is a blocking HTTPS call, so keep it off the event loop
+        loop = asyncio.get_running_loop()
+        headers = await loop.run_in_executor(None, self._auth_headers)
+
+        print(f"🚀 Sending {len(jobs)} requests to Imagen 4 Ultra ({concurrency_limit} at a time)...")
+
+        import aiohttp
+
+        # A single pooled session for the run; the semaphore caps requests in flight
+        sem = asyncio.Semaphore(concurrency_limit)
+        connector = aiohttp.TCPConnector(limit=concurrency_limit, limit_per_host=concurrency_limit)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await asyncio.gather(*[
+                self._generate_one(session, sem, headers, i, image_path, character_id)
+                for i, (image_path, character_id) in enumerate(jobs)
+            ])
+
+    async def run_pipeline(self, image_paths, character_ids, workers=4):
+        """Generate every character for every image through a bounded producer/consumer queue
+
+        Unlike generate_many, only a few jobs are materialized at a time: while some
+        workers wait on the API, others encode their next photo or save a result.
+
+        Args:
+            image_paths: Input photos
+            character_ids: Characters to generate for each photo
+            workers: Number of consumers, i.e. requests in flight (match the API quota)
+
+        Returns:
+            Dict mapping (image_path, character_id) to the output path (None for failed jobs)
+        """
+        for character_id in character_ids:
+            if character_id not in self.characters:
+                raise ValueError(f"Character '{character_id}' not found")
+
+        jobs = list(itertools.product(image_paths, character_ids))
+        if not self.credentials:
+            print("❌ No valid credentials - running in demo mode")
+            return {(image_path, character_id): self._demo_mode(image_path, character_id, f"{character_id}_demo_{i}.txt")
+                    for i, (image_path, character_id) in enumerate(jobs)}
+
+        print(f"🚀 Queueing {len(jobs)} jobs for Imagen 4 Ultra ({workers} workers)...")
+
+        queue = asyncio.Queue(maxsize=workers * 2)
+        results = {}
+
+        async def producer():
+            for job in enumerate(jobs):
+                await queue.put(job)
+            for _ in range(workers):
+                await queue.put(None)
+
+        async def consumer(session, sem):
+            while (job := await queue.get()) is not None:
+                index, (image_path, character_id) = job
+                # No headers: fetched per job so long runs pick up refreshed tokens; cached otherwise
+                results[image_path, character_id] = await self._generate_one(session, sem, None, index, image_path, character_id)
+
+        import aiohttp
+
+        # Concurrency is bounded by the worker count, so the semaphore never blocks
+        sem = asyncio.Semaphore(workers)
+        connector = aiohttp.TCPConnector(limit=workers, limit_per_host=workers)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(producer(), *[consumer(session, sem) for _ in range(workers)])
+        return results
+
+    async def _generate_one(self, session, sem, headers, index, image_path, character_id):
+        """Run one job of generate_many or run_pipeline, returning None instead of raising so
+        one bad photo or sample doesn't abort the rest of the batch"""
+        try:
+            return await self._run_job(session, sem, headers, index, image_path, character_id)
+        except Exception as e:
+            print(f"❌ Error generating {character_id} ({image_path}): {e}")
+            return None
+
+    async def _run_job(self, session, sem, headers, index, image_path, character_id):
+        """Encode, send, save and cache one job; headers of None are fetched here"""
+        loop = asyncio.get_running_loop()
+        if headers is None:
+            headers = await loop.run_in_executor(None, self._auth_headers)
+
+        # Reading and base64-encoding the photo is blocking work, so it runs in the executor
+        if image_path is None:
+            payload = self._scratch_payload(character_id)
+            tag = "_scratch"
+        else:
+            image_b64 = await loop.run_in_executor(None, _prepare_image, image_path, self.preserve_full_res)
+            payload = self._cosplay_payload(character_id, image_b64)
+            tag = self.output_tag
+
+        # Timestamps only have second resolution, so the job index keeps batch names unique
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = OUTPUT_FOLDER / f"{character_id}{tag}_{timestamp}_{index}.png"
+
+        # From-scratch jobs are meant to vary, so only transformations go through the cache
+        cache_key = None
+        if self.use_cache and image_path is not None:
+            cache_key = await loop.run_in_executor(None, _cache_key, payload)
+            if await loop.run_in_executor(None, _cache_lookup, cache_key, output_path):
+                print(f"♻️ Reused cached result {CACHE_FOLDER / f'{cache_key}.png'} for {character_id} ({image_path})")
+                return str(output_path)
+
+        async with sem:
+            result = await self._post(session, payload, headers)
+
+        if not result or not result.get("predictions"):
+            print(f"❌ No predictions returned for {character_id} ({image_path})")
+            return None
+
+        await loop.run_in_executor(_SAVE_EXECUTOR, _save_prediction, result["predictions"][0], output_path)
+        if cache_key:
+            await loop.run_in_executor(None, _cache_store, cache_key, output_path)
+
+        print(f"💾 Saved to: {output_path}")
+        return str(output_path)
+
+    async def _post(self, session, payload, headers):
+        """POST a payload to the endpoint, returning the parsed response or None on failure"""
+        try:
+            # Compressing a multi-MB body is blocking work, so it runs in the executor
+            body = await asyncio.get_running_loop().run_in_executor(None, _request_body, payload)
+            async with session.post(self.endpoint, data=body, headers=headers) as response:
+                if response.status == 200:
+                    return orjson.loads(await response.read())
+                print(f"❌ API request failed: {response.status}")
+                print(f"Response: {await response.text()}")
+                return None
+        except Exception as e:
+            print(f"❌ Error during generation: {e}")
+            return None
+
+    def _demo_mode(self, image_path, character_id, output_name=None):
+        """Demo mode when credentials are not available"""
+        character = self.characters[character_id]
+        print("🎭 DEMO MODE - No actual generation will occur")
+        print(f"📸 Would process: {image_path}")
+        print(f"🎭 Would transform to: {character['name']}")
+
+        if not output_name:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_name = f"{character_id}_demo_{timestamp}.txt"
+
+        output_path = OUTPUT_FOLDER / output_name
+
+        with open(output_path, 'w') as f:
+            f.write(f"Demo mode - would generate {character['name']} cosplay\n")
+            f.write(f"Input image: {image_path}\n")
+            f.write(f"Character: {character_id}\n")
+            f.write(f"Prompt: {character['prompt']}\n")
+
+        print(f"💾 Demo file saved to: {output_path}")
+        return str(output_path)
@@ -2,40 +2,9 @@
 # 
 # This version includes proper quality parameters and better prompts
 
-import os
-import json
-import base64
-import time
-from datetime import datetime
-from pathlib import Path
-from PIL import Image
-import requests
-from dotenv import load_dotenv
-from google.auth import default
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-
-# Load environment variables
-load_dotenv()
-
-# Configuration
-PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
-LOCATION = os.getenv("IMAGEN_LOCATION", "us-central1")
-CREDENTIALS_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-
-# Folders
-MODELS_FOLDER = Path("models")
-OUTPUT_FOLDER = Path("output")
-CHARACTERS_FILE = Path("characters.json")
-
-# Create folders if they don't exist
-MODELS_FOLDER.mkdir(exist_ok=True)
-OUTPUT_FOLDER.mkdir(exist_ok=True)
-
-print(f"📁 Models folder: {MODELS_FOLDER.absolute()}")
-print(f"📁 Output folder: {OUTPUT_FOLDER.absolute()}")
-print(f"🚀 Project ID: {PROJECT_ID}")
-print(f"🌍 Location: {LOCATION}")
+import sys
+import asyncio
+from cosplay_common import _ImagenBase, _parameters, _prepare_image, MODELS_FOLDER
 
 # 🎭 IMPROVED Character definitions with better prompts
 IMPROVED_CHARACTERS = {
@@ -60,165 +29,79 @@ print("Available characters:")
 for char_id, char_data in IMPROVED_CHARACTERS.items():
     print(f"  • {char_id}: {char_data['name']} ({char_data['series']})")
 
-# 🔑 Google Cloud Authentication (FIXED)
-class HighQualityImagenGenerator:
-    def __init__(self):
-        self.project_id = PROJECT_ID
-        self.location = LOCATION
-        
-        if not self.project_id:
-            raise ValueError("GOOGLE_CLOUD_PROJECT_ID not set in .env file")
-        
-        # Initialize credentials with proper scopes
-        try:
-            if CREDENTIALS_PATH and os.path.exists(CREDENTIALS_PATH):
-                # Use service account credentials with correct scopes
-                self.credentials = service_account.Credentials.from_service_account_file(
-                    CREDENTIALS_PATH,
-                    scopes=['https://www.googleapis.com/auth/cloud-platform']
-                )
-                print("✅ Google Cloud authentication successful!")
-            else:
-                # Fallback to default credentials (for local development)
-                self.credentials, _ = default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
-                print("✅ Google Cloud authentication successful!")
-        except Exception as e:
-            print(f"❌ Authentication failed: {e}")
-            print("💡 Make sure your .env file is configured correctly")
-            print("💡 Ensure GOOGLE_APPLICATION_CREDENTIALS points to a valid service account JSON file")
-            self.credentials = None
-        
-        # Imagen 4 Ultra endpoint
-        self.endpoint = f"https://{self.location}-aiplatform.googleapis.com/v1/projects/{self.project_id}/locations/{self.location}/publishers/google/models/imagen-4.0-ultra-generate-001:predict"
+# Negative prompt shared by every high-quality request
+NEGATIVE_PROMPT = "blurry, low quality, distorted, deformed, bad anatomy, bad proportions, extra limbs, missing limbs, mutated hands, poorly drawn face, poorly drawn hands, poorly drawn eyes, poorly drawn hair, poorly drawn body, poorly drawn clothes, poorly drawn background, poorly drawn details, low resolution, pixelated, grainy, noisy, artifacts, compression artifacts, jpeg artifacts, watermark, signature, text, logo, brand, commercial, advertisement, promotional, stock photo, generic, amateur, unprofessional, bad lighting, bad composition, bad framing, bad angle, bad perspective, bad proportions, bad anatomy, bad structure, bad form, bad shape, bad design, bad style, bad art, bad drawing, bad painting, bad photography, bad image, bad quality, bad result, bad output, bad generation, bad creation, bad production, bad work, bad job, bad performance, bad execution, bad implementation, bad realization, bad manifestation, bad materialization, bad actualization, bad concretization, bad embodiment, bad incarnation, bad personification, bad representation, bad depiction, bad portrayal, bad characterization, bad description, bad illustration, bad visualization, bad conceptualization, bad interpretation, bad translation, bad transformation, bad conversion, bad adaptation, bad modification, bad alteration, bad change, bad variation, bad deviation, bad divergence, bad difference, bad distinction, bad differentiation, bad discrimination, bad separation, bad division, bad partition, bad segmentation, bad classification, bad categorization, bad organization, bad arrangement, bad ordering, bad sequencing, bad structuring, bad formatting, bad layout, bad design, bad composition, bad construction, bad assembly, bad construction, bad building, bad creation, bad making, bad production, bad manufacturing, bad fabrication, bad construction, bad building, bad erection, bad establishment, bad foundation, bad base, bad ground, bad support, bad structure, bad framework, bad skeleton, bad backbone, bad spine, bad core, bad center, bad heart, bad essence, bad soul, bad spirit, bad energy, bad force, bad power, bad strength, bad might, bad vigor, bad vitality, bad life, bad existence, bad being, bad presence, bad reality, bad actuality, bad truth, bad fact, bad reality, bad actuality, bad truth, bad fact, bad reality, bad actuality, bad truth, bad fact"
+
+# HIGH QUALITY request parameters are the same for every call, so they are built once and shared by all payloads
+HQ_PARAMETERS = {
+    "sampleCount": 1,
+    "aspectRatio": "1:1",
+    "safetyFilterLevel": "block_some",
+    "personGeneration": "allow_adult",
+    "outputOptions": {
+        "compressionQuality": "lossless",
+        "mimeType": "image/png"
+    },
+    "editConfig": {
+        "editMode": "inpainting-replace",
+        "guidanceScale": 150,  # Higher guidance for better quality
+        "outputImageType": "EDITED_IMAGE",
+        "seed": None,  # Random seed for variety
+        "negativePrompt": NEGATIVE_PROMPT
+    }
+}
+
+# 🔑 Google Cloud Authentication (FIXED) - shared with the other generators via _ImagenBase
+class HighQualityImagenGenerator(_ImagenBase):
+    characters = IMPROVED_CHARACTERS
+    output_tag = "_hq"
     
-    def generate_cosplay(self, image_path, character_id, output_name=None, quality="high"):
-        """Generate high-quality cosplay transformation using Imagen 4 Ultra"""
+    def generate_cosplay(self, image_path, character_id, output_name=None, quality="high", num_samples=1):
+        """Generate high-quality cosplay transformation using Imagen 4 Ultra
+        
+        num_samples > 1 requests that many variants in a single API call and
+        returns a list of paths instead of a single path
+        """
         
         if not self.credentials:
             print("❌ No valid credentials - running in demo mode")
             return self._demo_mode(image_path, character_id, output_name)
         
         # Load and encode image
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-        
-        image_b64 = base64.b64encode(image_data).decode('utf-8')
+        image_b64 = _prepare_image(image_path, self.preserve_full_res)
         
         # Get character prompt
         if character_id not in IMPROVED_CHARACTERS:
             raise ValueError(f"Character '{character_id}' not found")
         
-        prompt = IMPROVED_CHARACTERS[character_id]['prompt']
         character_name = IMPROVED_CHARACTERS[character_id]['name']
         
         print(f"🎭 Generating HIGH QUALITY {character_name} cosplay...")
         print(f"📸 Input: {image_path}")
         
         # HIGH QUALITY API payload with proper parameters
-        payload = {
+        payload = self._cosplay_payload(character_id, image_b64, num_samples)
+
+        print("⏳ This may take 30-60 seconds for high quality generation...")
+        return self._generate_sync(payload, character_id, output_name, num_samples,
+                                   tag=self.output_tag, label="HIGH QUALITY ")
+    
+    def _cosplay_payload(self, character_id, image_b64, num_samples=1):
+        """HIGH QUALITY API payload for a character and base64 input image"""
+        return {
             "instances": [{
-                "prompt": prompt,
+                "prompt": IMPROVED_CHARACTERS[character_id]['prompt'],
                 "image": {
                     "bytesBase64Encoded": image_b64
                 },
-                "parameters": {
-                    "sampleCount": 1,
-                    "aspectRatio": "1:1",
-                    "safetyFilterLevel": "block_some",
-                    "personGeneration": "allow_adult",
-                    "outputOptions": {
-                        "compressionQuality": "lossless",
-                        "mimeType": "image/png"
-                    },
-                    "editConfig": {
-                        "editMode": "inpainting-replace",
-                        "guidanceScale": 150,  # Higher guidance for better quality
-                        "outputImageType": "EDITED_IMAGE",
-                        "seed": None,  # Random seed for variety
-                        "negativePrompt": "blurry, low quality, distorted, deformed, bad anatomy, bad proportions, extra limbs, missing limbs, mutated hands, poorly drawn face, poorly drawn hands, poorly drawn eyes, poorly drawn hair, poorly drawn body, poorly drawn clothes, poorly drawn background, poorly drawn details, low resolution, pixelated, grainy, noisy, artifacts, compression artifacts, jpeg artifacts, watermark, signature, text, logo, brand, commercial, advertisement, promotional, stock photo, generic, amateur, unprofessional, bad lighting, bad composition, bad framing, bad angle, bad perspective, bad proportions, bad anatomy, bad structure, bad form, bad shape, bad design, bad style, bad art, bad drawing, bad painting, bad photography, bad image, bad quality, bad result, bad output, bad generation, bad creation, bad production, bad work, bad job, bad performance, bad execution, bad implementation, bad realization, bad manifestation, bad materialization, bad actualization, bad concretization, bad embodiment, bad incarnation, bad personification, bad representation, bad depiction, bad portrayal, bad characterization, bad description, bad illustration, bad visualization, bad conceptualization, bad interpretation, bad translation, bad transformation, bad conversion, bad adaptation, bad modification, bad alteration, bad change, bad variation, bad deviation, bad divergence, bad difference, bad distinction, bad differentiation, bad discrimination, bad separation, bad division, bad partition, bad segmentation, bad classification, bad categorization, bad organization, bad arrangement, bad ordering, bad sequencing, bad structuring, bad formatting, bad layout, bad design, bad composition, bad construction, bad assembly, bad construction, bad building, bad creation, bad making, bad production, bad manufacturing, bad fabrication, bad construction, bad building, bad erection, bad establishment, bad foundation, bad base, bad ground, bad support, bad structure, bad framework, bad skeleton, bad backbone, bad spine, bad core, bad center, bad heart, bad essence, bad soul, bad spirit, bad energy, bad force, bad power, bad strength, bad might, bad vigor, bad vitality, bad life, bad existence, bad being, bad presence, bad reality, bad actuality, bad truth, bad fact, bad reality, bad actuality, bad truth, bad fact, bad reality, bad actuality, bad truth, bad fact"
-                    }
-                }
+                "parameters": _parameters(HQ_PARAMETERS, num_samples)
             }]
         }
-        
-        # Make API request
-        try:
-            # Get access token
-            self.credentials.refresh(Request())
-            access_token = self.credentials.token
-            
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            print("🚀 Sending HIGH QUALITY request to Imagen 4 Ultra...")
-            print("⏳ This may take 30-60 seconds for high quality generation...")
-            
-            response = requests.post(self.endpoint, json=payload, headers=headers)
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                if "predictions" in result and len(result["predictions"]) > 0:
-                    # Decode and save image
-                    image_data = base64.b64decode(result["predictions"][0]["bytesBase64Encoded"])
-                    
-                    # Generate output filename
-                    if not output_name:
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        output_name = f"{character_id}_hq_{timestamp}.png"
-                    
-                    output_path = OUTPUT_FOLDER / output_name
-                    
-                    with open(output_path, 'wb') as f:
-                        f.write(image_data)
-                    
-                    # Check image dimensions
-                    with Image.open(output_path) as img:
-                        width, height = img.size
-                        print(f"✅ HIGH QUALITY cosplay generated successfully!")
-                        print(f"📐 Image dimensions: {width}x{height}")
-                        print(f"💾 Saved to: {output_path}")
-                    
-                    return str(output_path)
-                else:
-                    print("❌ No predictions returned from API")
-                    print(f"Response: {result}")
-                    return None
-            else:
-                print(f"❌ API request failed: {response.status_code}")
-                print(f"Response: {response.text}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error during generation: {e}")
-            return None
-    
-    def _demo_mode(self, image_path, character_id, output_name=None):
-        """Demo mode when credentials are not available"""
-        print("🎭 DEMO MODE - No actual generation will occur")
-        print(f"📸 Would process: {image_path}")
-        print(f"🎭 Would transform to: {IMPROVED_CHARACTERS[character_id]['name']}")
-        
-        if not output_name:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_name = f"{character_id}_demo_{timestamp}.txt"
-        
-        output_path = OUTPUT_FOLDER / output_name
-        
-        with open(output_path, 'w') as f:
-            f.write(f"Demo mode - would generate {IMPROVED_CHARACTERS[character_id]['name']} cosplay\n")
-            f.write(f"Input image: {image_path}\n")
-            f.write(f"Character: {character_id}\n")
-            f.write(f"Prompt: {IMPROVED_CHARACTERS[character_id]['prompt']}\n")
-        
-        print(f"💾 Demo file saved to: {output_path}")
-        return str(output_path)
 
 # Test the high-quality generator
 if __name__ == "__main__":
-    generator = HighQualityImagenGenerator()
+    # Pass --cache to reuse outputs of identical earlier requests instead of regenerating
+    generator = HighQualityImagenGenerator(use_cache="--cache" in sys.argv)
     
     # List available model images
     model_images = list(MODELS_FOLDER.glob("*.jpg")) + list(MODELS_FOLDER.glob("*.jpeg")) + list(MODELS_FOLDER.glob("*.png"))
@@ -228,8 +111,14 @@ if __name__ == "__main__":
         for img in model_images:
             print(f"  • {img.name}")
         
+        if "--all" in sys.argv:
+            # Every model image x every character, through the queued pipeline
+            results = asyncio.run(generator.run_pipeline([str(img) for img in model_images], list(IMPROVED_CHARACTERS)))
+            succeeded = sum(1 for path in results.values() if path)
+            print(f"✅ Generated {succeeded}/{len(results)} HIGH QUALITY cosplay images. Check the output folder.")
+        
         # Generate HIGH QUALITY cosplay for first image and first character
-        if model_images and IMPROVED_CHARACTERS:
+        elif IMPROVED_CHARACTERS:
             first_image = model_images[0]
             first_character = list(IMPROVED_CHARACTERS.keys())[0]
             
@@ -11,26 +11,142 @@ Examples:
     python generate.py model1.jpg sailor-moon custom_name
 """
 
+import io
 import os
-import json
-import base64
+import orjson
+import mmap
 import time
 import sys
-from datetime import datetime
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image
+from PIL import Image, ImageOps
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from google.auth import default
 from google.auth.transport.requests import Request
+from cosplay_common import _TOKEN_CACHE
+
+# pybase64 is optional; its SIMD codec is a drop-in for the stdlib one on large images
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 # Load environment variables
 load_dotenv()
 
+# Image types offered by list_models
+MODEL_EXTENSIONS = {'jpg', 'jpeg', 'png'}
+
+# Input photos larger than this on either side are downscaled before upload
+MAX_INPUT_DIM = 1536
+
+# Input bytes base64-encoded per step; a multiple of 3 so chunks encode without padding
+B64_CHUNK_SIZE = 3 * 64 * 1024
+
+# Image transformation parameters sent with every request
+IMAGE_PARAMETERS = {
+    "sampleCount": 1,
+    "aspectRatio": "1:1",
+    "safetyFilterLevel": "block_some",
+    "personGeneration": "allow_adult",
+    "outputOptions": {
+        "compressionQuality": "lossless",
+        "mimeType": "image/png"
+    },
+    "editConfig": {
+        "editMode": "inpainting-replace",
+        "guidanceScale": 120,
+        "outputImageType": "EDITED_IMAGE"
+    },
+    "stylizationLevel": 100
+}
+
+# Request body text after the base64 image; the parameters are the same for every call
+BODY_SUFFIX = b'"},"parameters":' + orjson.dumps(IMAGE_PARAMETERS) + b'}]}'
+
+@lru_cache(maxsize=128)
+def _body_prefix(prompt):
+    """Request body text before the base64 image, serialized once per prompt"""
+    return b'{"instances":[{"prompt":' + orjson.dumps(prompt) + b',"image":{"bytesBase64Encoded":"'
+
+@lru_cache(maxsize=4)
+def _load_characters(path, mtime_ns):
+    """Parsed character definitions, reused until the file changes (mtime_ns is part of the cache key)"""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def _wrap_base64(prefix, data, suffix):
+    """prefix + base64(data) + suffix, encoded straight into a single pre-sized bytearray"""
+    b64_len = (len(data) + 2) // 3 * 4
+    body = bytearray(len(prefix) + b64_len + len(suffix))
+    body[:len(prefix)] = prefix
+    # Encode chunk by chunk so there is never a second full-size copy of the base64 text;
+    # the memoryviews make reading each slice and copying its output plain memcpys
+    pos = len(prefix)
+    with memoryview(data) as src, memoryview(body) as dst:
+        for i in range(0, len(src), B64_CHUNK_SIZE):
+            chunk = base64.b64encode(src[i:i + B64_CHUNK_SIZE])
+            dst[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    body[len(prefix) + b64_len:] = suffix
+    return body
+
+def _downscaled_jpeg(image):
+    """JPEG bytes of an open image file shrunk to fit MAX_INPUT_DIM, or None if it already fits"""
+    # PIL leaves a file object it was given open, so the caller can still map it
+    with Image.open(image) as img:
+        if max(img.size) <= MAX_INPUT_DIM:
+            return None
+        # Re-encoding drops EXIF, so apply the camera orientation to the pixels first
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((MAX_INPUT_DIM, MAX_INPUT_DIM), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.convert('RGB').save(buf, format='JPEG', quality=92)
+        return buf.getbuffer()
+
+def _write_file(path, data):
+    """Write data to path with raw os.write calls, skipping the buffered file layer"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # os.write may write less than asked, so keep going from where it stopped
+        with memoryview(data) as view:
+            while view:
+                view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+@lru_cache(maxsize=None)
+def _demo_png():
+    """PNG bytes of the 512x512 light blue demo placeholder, encoded once per process"""
+    # OpenCV is optional; it encodes faster than PIL when installed. Imported here, not at the
+    # top, so CLI runs that never reach demo mode don't pay for loading it
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        cv2 = None
+
+    if cv2 is not None:
+        # OpenCV is BGR, so light blue (173, 216, 230) is reversed
+        ok, buf = cv2.imencode('.png', np.full((512, 512, 3), (230, 216, 173), np.uint8),
+                               [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        if ok:
+            return buf.tobytes()
+
+    buf = io.BytesIO()
+    Image.new('RGB', (512, 512), color='lightblue').save(buf, format='PNG', optimize=True)
+    return buf.getvalue()
+
 class CosplayGenerator:
-    def __init__(self):
+    def __init__(self, preserve_full_res=False):
         self.project_id = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
         self.location = os.getenv("IMAGEN_LOCATION", "us-central1")
+        self.preserve_full_res = preserve_full_res
 
         # Folders
         self.models_folder = Path("models")
@@ -42,8 +158,15 @@ class CosplayGenerator:
         self.output_folder.mkdir(exist_ok=True)
 
         # Load characters
-        with open(self.characters_file, 'r') as f:
-            self.characters = json.load(f)
+        self.characters = _load_characters(str(self.characters_file), self.characters_file.stat().st_mtime_ns)
+
+        # Pooled HTTP session, so repeated generations reuse the TLS connection to the API
+        self.session = requests.Session()
+        # Once retries run out, return the last response so the API error and its body get reported
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                        allowed_methods=["POST"], raise_on_status=False)
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries))
+        self.session.headers.update({"Content-Type": "application/json"})
 
         # Initialize Google Cloud
         self._init_auth()
@@ -68,117 +191,178 @@ class CosplayGenerator:
             print("💡 Running in demo mode")
             self.credentials = None
 
-    def generate(self, image_file, character_id, output_name=None):
-        """Generate cosplay transformation"""
+    def _auth_headers(self):
+        """Request headers for the next call, from the token cache shared with the other generators
 
-        # Validate inputs
-        image_path = self.models_folder / image_file
-        if not image_path.exists():
-            print(f"❌ Image not found: {image_path}")
-            return None
+        The token is refreshed only when expired or about to expire, under a lock that keeps
+        generate_batch workers from refreshing in parallel.
+        """
+        return _TOKEN_CACHE.headers(self.credentials)
 
-        if character_id not in self.characters:
-            print(f"❌ Character '{character_id}' not found")
-            print(f"Available: {list(self.characters.keys())}")
+    def generate(self, image_file, character_id, output_name=None):
+        """Generate cosplay transformation"""
+        image, character = self._resolve_job(image_file, character_id)
+        if character is None:
             return None
 
-        character = self.characters[character_id]
-        print(f"🎭 Generating {character['name']} cosplay...")
-        print(f"📸 Input: {image_file}")
-
         if not self.credentials:
-            return self._demo_mode(image_path, character_id, character['name'], output_name)
-
-        # Load and encode image
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-
-        image_b64 = base64.b64encode(image_data).decode('utf-8')
-
-        # Prepare API payload
-        payload = {
-            "instances": [{
-                "prompt": character['prompt'],
-                "image": {
-                    "bytesBase64Encoded": image_b64
-                },
-                "parameters": {
-                    "sampleCount": 1,
-                    "aspectRatio": "1:1",
-                    "safetyFilterLevel": "block_some",
-                    "personGeneration": "allow_adult",
-                    "outputOptions": {
-                        "compressionQuality": "lossless",
-                        "mimeType": "image/png"
-                    },
-                    "editConfig": {
-                        "editMode": "inpainting-replace",
-                        "guidanceScale": 120,
-                        "outputImageType": "EDITED_IMAGE"
-                    },
-                    "stylizationLevel": 100
-                }
-            }]
-        }
-
-        # Make API request
-        headers = {
-            "Authorization": f"Bearer {self.credentials.token}",
-            "Content-Type": "application/json"
-        }
+            with image:
+                return self._demo_mode(image.name, character_id, character['name'], output_name)
 
+        # Unreadable photos and failed token refreshes are reported like API errors, so a
+        # generate_batch job that fails returns None instead of aborting the whole batch
         try:
+            # Build the request body around the base64 image instead of serializing a payload dict
+            with image:
+                body = self._request_body(image, character)
+
+            # Make API request
+            headers = self._auth_headers()
+
             print("🚀 Calling Imagen 4 Ultra API...")
             start_time = time.time()
 
-            response = requests.post(
+            response = self.session.post(
                 self.endpoint,
                 headers=headers,
-                json=payload,
+                data=body,
                 timeout=180
             )
 
             end_time = time.time()
 
-            if response.status_code == 200:
-                data = response.json()
-                if "predictions" in data and data["predictions"]:
-                    prediction = data["predictions"][0]
-                    result_b64 = prediction.get("bytesBase64Encoded")
-
-                    if result_b64:
-                        result_path = self._save_result(result_b64, character_id, character['name'], output_name)
-                        print(f"⏱️  Generation time: {end_time - start_time:.2f} seconds")
-                        print(f"🎉 Success! Result saved: {result_path}")
-                        return result_path
-                    else:
-                        print("❌ No image data in response")
-                        return None
-                else:
-                    print("❌ No predictions in response")
-                    return None
+            return self._handle_response(response.status_code, response.content, character_id, character,
+                                         output_name, end_time - start_time)
+
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return None
+
+    async def generate_async(self, image_file, character_id, output_name=None, session=None):
+        """Generate cosplay transformation without blocking the event loop
+
+        Pass an aiohttp.ClientSession to share its connection pool between calls;
+        otherwise a session is opened just for this call.
+        """
+        image, character = self._resolve_job(image_file, character_id)
+        if character is None:
+            return None
+
+        if not self.credentials:
+            with image:
+                return self._demo_mode(image.name, character_id, character['name'], output_name)
+
+        # Imported here so the synchronous CLI doesn't pay aiohttp's startup cost
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        try:
+            # Encoding the photo and refreshing the token are blocking work, so they run in the executor
+            with image:
+                body = await loop.run_in_executor(None, self._request_body, image, character)
+            headers = await loop.run_in_executor(None, self._auth_headers)
+
+            print("🚀 Calling Imagen 4 Ultra API...")
+            start_time = time.time()
+
+            timeout = aiohttp.ClientTimeout(total=180)
+            if session is None:
+                async with aiohttp.ClientSession() as own_session:
+                    async with own_session.post(self.endpoint, data=body, headers=headers, timeout=timeout) as response:
+                        status, content = response.status, await response.read()
             else:
-                print(f"❌ API Error {response.status_code}: {response.text}")
-                return None
+                async with session.post(self.endpoint, data=body, headers=headers, timeout=timeout) as response:
+                    status, content = response.status, await response.read()
+
+            end_time = time.time()
+
+            return await loop.run_in_executor(None, self._handle_response, status, content, character_id,
+                                              character, output_name, end_time - start_time)
 
         except Exception as e:
             print(f"❌ Error: {e}")
             return None
 
+    def _resolve_job(self, image_file, character_id):
+        """Open input image and character definition for a job, or (None, None) if either is missing"""
+        # Validate inputs
+        if character_id not in self.characters:
+            print(f"❌ Character '{character_id}' not found")
+            print(f"Available: {list(self.characters.keys())}")
+            return None, None
+
+        # Opening the photo is the existence check, so it is only looked up once
+        image_path = self.models_folder / image_file
+        try:
+            image = open(image_path, 'rb')
+        except FileNotFoundError:
+            print(f"❌ Image not found: {image_path}")
+            return None, None
+
+        character = self.characters[character_id]
+        print(f"🎭 Generating {character['name']} cosplay...")
+        print(f"📸 Input: {image_file}")
+        return image, character
+
+    def _handle_response(self, status, content, character_id, character, output_name, elapsed):
+        """Save the image from an API response, returning its path (None on failure)"""
+        if status == 200:
+            data = orjson.loads(content)
+            if "predictions" in data and data["predictions"]:
+                prediction = data["predictions"][0]
+                result_b64 = prediction.get("bytesBase64Encoded")
+
+                if result_b64:
+                    result_path = self._save_result(result_b64, character_id, character['name'], output_name)
+                    print(f"⏱️  Generation time: {elapsed:.2f} seconds")
+                    print(f"🎉 Success! Result saved: {result_path}")
+                    return result_path
+                else:
+                    print("❌ No image data in response")
+                    return None
+            else:
+                print("❌ No predictions in response")
+                return None
+        else:
+            print(f"❌ API Error {status}: {content.decode('utf-8', errors='replace')}")
+            return None
+
+    def generate_batch(self, jobs, max_workers=8):
+        """Generate several cosplays concurrently
+
+        jobs is a list of (image_file, character_id) or (image_file, character_id, output_name)
+        tuples. Returns the result paths in job order, with None for failed jobs.
+        """
+        # Each job spends nearly all its time waiting on the API, so threads share one session and token
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda job: self.generate(*job), jobs))
+
+    def _request_body(self, image, character):
+        """JSON request body for a character and open image file, with the image base64-encoded straight into place"""
+        # Everything but the image is serialized ahead of time as the text either side of it
+        prefix = _body_prefix(character['prompt'])
+        suffix = BODY_SUFFIX
+
+        if not self.preserve_full_res:
+            # Imagen gains nothing from larger inputs, so big photos are shrunk before upload
+            resized = _downscaled_jpeg(image)
+            if resized is not None:
+                return _wrap_base64(prefix, resized, suffix)
+
+        with mmap.mmap(image.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _wrap_base64(prefix, mm, suffix)
+
     def _demo_mode(self, image_path, character_id, character_name, output_name):
         """Demo mode - creates a placeholder result"""
         print(f"🎭 Demo Mode: Creating placeholder for {character_name}")
 
-        # Create a simple demonstration image
-        demo_img = Image.new('RGB', (512, 512), color='lightblue')
-
         # Save demo result
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         if not output_name:
             output_name = f"{character_id}_{timestamp}_demo"
 
         output_path = self.output_folder / f"{output_name}.png"
-        demo_img.save(output_path)
+        _write_file(output_path, _demo_png())
 
         print(f"✅ Demo result saved: {output_path}")
         return output_path
@@ -189,24 +373,23 @@ class CosplayGenerator:
         image_data = base64.b64decode(image_b64)
 
         # Generate filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         if not output_name:
             output_name = f"{character_id}_{timestamp}"
 
         output_path = self.output_folder / f"{output_name}.png"
 
         # Save image
-        with open(output_path, 'wb') as f:
-            f.write(image_data)
+        _write_file(output_path, image_data)
 
         print(f"✅ {character_name} cosplay saved: {output_path}")
         return output_path
 
     def list_models(self):
         """List available model images"""
-        model_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png']:
-            model_files.extend(list(self.models_folder.glob(ext)))
+        # One directory scan, matching extensions from a set
+        model_files = [Path(entry.path) for entry in os.scandir(self.models_folder)
+                       if entry.is_file() and entry.name.rpartition('.')[2].lower() in MODEL_EXTENSIONS]
 
         print(f"📸 Found {len(model_files)} model images:")
         for i, file_path in enumerate(model_files):